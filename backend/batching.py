@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger("synergysphere.batching")
+
+
+class BatchWriter:
+    """Buffers inserts and writes them with insert_many(ordered=False).
+
+    A batch is flushed when it reaches max_batch documents or max_delay
+    seconds after its first document, whichever comes first. Callers never
+    wait on the write. on_written, if given, is awaited with the documents of
+    each batch that were actually inserted.
+    """
+
+    def __init__(self, get_collection: Callable, max_batch: int = 500, max_delay: float = 1.0,
+                 on_written: Optional[Callable[[List[dict]], Awaitable]] = None):
+        self.get_collection = get_collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_written = on_written
+        self._pending: List[dict] = []
+        self._first_pending_at: Optional[float] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed = 0
+
+    def add(self, doc: dict):
+        self._pending.append(doc)
+        self.enqueued += 1
+        self._pending_changed()
+
+    def _pending_changed(self):
+        first = self._first_pending_at is None
+        if first:
+            self._first_pending_at = time.monotonic()
+        # Wake the flusher to arm the delay timer, or to flush a full batch now
+        if self._wakeup is not None and (first or len(self._pending) >= self.max_batch):
+            self._wakeup.set()
+
+    def _due(self) -> bool:
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.max_batch or time.monotonic() >= self._first_pending_at + self.max_delay
+
+    def _take_pending(self) -> List[dict]:
+        batch, self._pending = self._pending, []
+        self._first_pending_at = None
+        return batch
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._take_pending()
+                for start in range(0, len(batch), self.max_batch):
+                    await self._write(batch[start:start + self.max_batch])
+
+    async def _write(self, batch: List[dict]):
+        self.flushes += 1
+        inserted = batch
+        try:
+            result = await self.get_collection().insert_many(batch, ordered=False)
+            self.written += len(result.inserted_ids)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            self.written += exc.details.get("nInserted", 0)
+            self.failed += len(errors)
+            logger.error("Batch insert partially failed: %s", errors[:3])
+            failed_indexes = {error["index"] for error in errors}
+            inserted = [doc for index, doc in enumerate(batch) if index not in failed_indexes]
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Batch insert of %d documents failed", len(batch))
+            return
+        if self.on_written is not None and inserted:
+            try:
+                await self.on_written(inserted)
+            except Exception:
+                logger.exception("on_written hook failed for %d documents", len(inserted))
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Let the flusher finish a write in progress and exit, then write what is left.
+
+        The flusher is not cancelled: that could interrupt a batch between its
+        insert and its on_written hook.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            timeout = None
+            if self._first_pending_at is not None:
+                timeout = max(0.0, self._first_pending_at + self.max_delay - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._due():
+                await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed": self.failed,
+        }
+
+
+class CoalescingBatchWriter(BatchWriter):
+    """BatchWriter that merges pending documents sharing a coalesce key.
+
+    A document added while another with the same key is still pending
+    replaces its mutable fields and bumps its "count" instead of producing a
+    second insert. The merge window is therefore the flush delay.
+    """
+
+    def __init__(self, get_collection: Callable, key: Callable[[dict], Optional[Hashable]], **kwargs):
+        super().__init__(get_collection, **kwargs)
+        self.key = key
+        self._by_key: Dict[Hashable, dict] = {}
+        self.coalesced = 0
+
+    def add(self, doc: dict) -> dict:
+        """Queue doc; returns the document that will actually be written"""
+        key = self.key(doc)
+        existing = self._by_key.get(key) if key is not None else None
+        if existing is not None:
+            existing.update({k: v for k, v in doc.items() if k != "_id"})
+            existing["count"] = existing.get("count", 1) + 1
+            self.coalesced += 1
+            return existing
+        if key is not None:
+            self._by_key[key] = doc
+        super().add(doc)
+        return doc
+
+    def _take_pending(self) -> List[dict]:
+        self._by_key = {}
+        return super()._take_pending()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "coalesced": self.coalesced}
+
+
+class DeltaBuffer(BatchWriter):
+    """Sums numeric deltas per key and hands them to apply() in batches.
+
+    Same flush timing as BatchWriter, but nothing is inserted: apply is
+    awaited with {key: delta} for the keys whose deltas did not cancel out.
+    pending(key) is what has not been applied yet, for reads that must
+    include it.
+    """
+
+    def __init__(self, apply: Callable[[Dict[Hashable, int]], Awaitable], **kwargs):
+        super().__init__(None, **kwargs)
+        self.apply = apply
+        self._by_key: Dict[Hashable, dict] = {}
+        self.coalesced = 0
+
+    def add(self, key: Hashable, delta: int):
+        entry = self._by_key.get(key)
+        if entry is not None:
+            entry["delta"] += delta
+            self.coalesced += 1
+            return
+        entry = self._by_key[key] = {"key": key, "delta": delta}
+        super().add(entry)
+
+    def pending(self, key: Hashable) -> int:
+        entry = self._by_key.get(key)
+        return entry["delta"] if entry is not None else 0
+
+    def _take_pending(self) -> List[dict]:
+        self._by_key = {}
+        return super()._take_pending()
+
+    async def _write(self, batch: List[dict]):
+        self.flushes += 1
+        deltas = {entry["key"]: entry["delta"] for entry in batch if entry["delta"]}
+        if not deltas:
+            return
+        try:
+            await self.apply(deltas)
+            self.written += len(deltas)
+        except Exception:
+            self.failed += len(deltas)
+            logger.exception("Applying %d buffered deltas failed", len(deltas))
+
+    def stats(self) -> dict:
+        return {**super().stats(), "coalesced": self.coalesced}
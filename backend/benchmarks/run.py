@@ -0,0 +1,266 @@
+"""Latency benchmark for the SynergySphere API.
+
+Seeds a synthetic dataset, drives the FastAPI app in-process through httpx's
+ASGI transport and reports p50/p95/p99 latency, requests per second and
+MongoDB round trips per request for each scenario.
+
+    cd backend
+    python -m benchmarks.run                                # mongomock stand-in
+    python -m benchmarks.run --mongo-uri mongodb://localhost:27017
+    python -m benchmarks.run --save-baseline bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.2   # exit 1 on regression
+
+The mongomock stand-in is good for comparing Python-side cost (routing,
+auth, serialisation); use a real mongod for anything index related.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DB_NAME = "synergysphere_bench"
+
+
+class CountingCollection:
+    """Counts calls that cost a server round trip (cursor methods count once)"""
+
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr) or name.startswith("_") or name in ("with_options",):
+            return attr
+
+        def counted(*args, **kwargs):
+            self._counter[0] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+class CountingDatabase:
+    def __init__(self, database):
+        self._database = database
+        self.round_trips = [0]
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name], self.round_trips)
+
+    def __getattr__(self, name):
+        # Database methods and properties pass through; anything else is a collection
+        if name.startswith("_") or hasattr(type(self._database), name):
+            return getattr(self._database, name)
+        return CountingCollection(self._database[name], self.round_trips)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def build_scenarios(data):
+    rng = random.Random(7)
+    project_ids = [str(p) for p in data["project_ids"]]
+    task_ids = [str(t) for t in data["task_ids"]]
+    notification_ids = [str(n) for n in data["notification_ids"]]
+    outsider = str(data["user_ids"][-1])
+    toggle = {"n": 0, "member": 0}
+
+    def task_status():
+        toggle["n"] += 1
+        return {"status": "completed" if toggle["n"] % 2 else "pending"}
+
+    def member_add_remove():
+        # Alternate adding and removing the same user so every request does real work
+        toggle["member"] += 1
+        project_id = project_ids[0]
+        if toggle["member"] % 2:
+            return "POST", f"/api/v1/projects/{project_id}/members", {"user_id": outsider, "role": "viewer"}
+        return "DELETE", f"/api/v1/projects/{project_id}/members/{outsider}", None
+
+    def batch_task_status():
+        # A multi-select board move: 20 status updates in one request
+        project_index = rng.randrange(len(project_ids))
+        per_project = len(task_ids) // len(project_ids)
+        chosen = rng.sample(task_ids[project_index * per_project:(project_index + 1) * per_project], min(20, per_project))
+        status = task_status()
+        operations = [{"op": "update", "task_id": task_id, "data": status} for task_id in chosen]
+        return "POST", f"/api/v1/projects/{project_ids[project_index]}/tasks:batch", {"operations": operations}
+
+    return {
+        "get_me": lambda: ("GET", "/api/v1/users/me", None),
+        "list_projects": lambda: ("GET", "/api/v1/projects", None),
+        "get_project": lambda: ("GET", f"/api/v1/projects/{rng.choice(project_ids)}", None),
+        "list_project_tasks": lambda: ("GET", f"/api/v1/projects/{rng.choice(project_ids)}/tasks", None),
+        "list_project_tasks_page": lambda: ("GET", f"/api/v1/projects/{rng.choice(project_ids)}/tasks?limit=50", None),
+        "get_task_comments": lambda: ("GET", f"/api/v1/tasks/{rng.choice(task_ids)}/comments", None),
+        "get_task_comments_page": lambda: ("GET", f"/api/v1/tasks/{rng.choice(task_ids)}/comments?limit=20", None),
+        "comment_counts": lambda: ("POST", "/api/v1/tasks/comment_counts", {"task_ids": rng.sample(task_ids, min(50, len(task_ids)))}),
+        "get_notifications": lambda: ("GET", "/api/v1/notifications", None),
+        "unread_count": lambda: ("GET", "/api/v1/notifications/unread_count", None),
+        "project_activity": lambda: ("GET", f"/api/v1/projects/{rng.choice(project_ids)}/activity?limit=20", None),
+        "dashboard": lambda: ("GET", "/api/v1/dashboard", None),
+        "search_users": lambda: ("GET", "/api/v1/users/search?q=user00", None),
+        "update_task_status": lambda: ("PUT", f"/api/v1/tasks/{rng.choice(task_ids)}", task_status()),
+        "batch_task_status": batch_task_status,
+        "update_project": lambda: ("PUT", f"/api/v1/projects/{rng.choice(project_ids)}", {"description": "updated"}),
+        "member_add_remove": member_add_remove,
+        "mark_notification_read": lambda: ("PUT", f"/api/v1/notifications/{rng.choice(notification_ids)}/read", None),
+        "update_me": lambda: ("PUT", "/api/v1/users/me", {"username": "user00000"}),
+    }
+
+
+async def run_scenario(client, headers, make_request, requests, concurrency, counting_db):
+    latencies = []
+    errors = 0
+    remaining = [requests]
+
+    async def worker():
+        nonlocal errors
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            method, path, body = make_request()
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:  # 5xx included: app exceptions come back as 500s
+                errors += 1
+
+    round_trips_before = counting_db.round_trips[0]
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "db_round_trips_per_request": round((counting_db.round_trips[0] - round_trips_before) / max(1, len(latencies)), 2),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return regressions where p95 grew (or rps dropped) by more than threshold"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+        if base["rps"] and result["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{name}: rps {base['rps']} -> {result['rps']}")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'scenario':<26}{'reqs':>7}{'err':>5}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db/req':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<26}{r['requests']:>7}{r['errors']:>5}{r['rps']:>10}{r['p50_ms']:>10}"
+              f"{r['p95_ms']:>10}{r['p99_ms']:>10}{r['db_round_trips_per_request']:>8}")
+
+
+async def main(args):
+    if args.mongo_uri:
+        os.environ["MONGO_URI"] = args.mongo_uri
+    else:
+        # Nothing to index or explain on the stand-in
+        os.environ.setdefault("ENSURE_INDEXES", "false")
+        os.environ.setdefault("INDEX_VERIFY", "off")
+    os.environ.setdefault("BCRYPT_ROUNDS", str(args.bcrypt_rounds))
+    # One client hammering one route is exactly what the limiter is there to stop
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    import httpx
+    import init_db
+    import main as app_module
+    from benchmarks.seed import seed
+
+    if args.mongo_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        raw_db = AsyncIOMotorClient(args.mongo_uri)[BENCH_DB_NAME]
+        await raw_db.client.drop_database(BENCH_DB_NAME)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        from mongomock_compat import patch_mongomock
+        patch_mongomock()
+        raw_db = AsyncMongoMockClient()[BENCH_DB_NAME]
+
+    data = await seed(
+        raw_db, orgs=args.orgs, users=args.users, projects=args.projects, members=args.members,
+        tasks=args.tasks, comments=args.comments, notifications=args.notifications, rounds=args.bcrypt_rounds,
+    )
+    counting_db = CountingDatabase(raw_db)
+    init_db.bind(counting_db)
+
+    token = app_module.create_access_token({"user_id": str(data["user"]["_id"])})
+    headers = {"Authorization": f"Bearer {token}"}
+    scenarios = build_scenarios(data)
+    selected = args.only.split(",") if args.only else list(scenarios)
+
+    results = {}
+    async with app_module.lifespan(app_module.app):
+        # A scenario that fails counts its 500s as errors instead of ending the run
+        transport = httpx.ASGITransport(app=app_module.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in selected:
+                make_request = scenarios[name]
+                await run_scenario(client, headers, make_request, args.warmup, 1, counting_db)
+                results[name] = await run_scenario(client, headers, make_request, args.requests, args.concurrency, counting_db)
+
+    print(f"dataset: {data['counts']}  backend: {'mongod' if args.mongo_uri else 'mongomock'}")
+    print_table(results)
+
+    report = {"dataset": data["counts"], "backend": "mongod" if args.mongo_uri else "mongomock", "results": results}
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("REGRESSIONS:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print(f"no regression beyond {args.threshold:.0%}")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="benchmark against this mongod (database %s is dropped)" % BENCH_DB_NAME)
+    parser.add_argument("--orgs", type=int, default=2)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--members", type=int, default=25, help="members per project")
+    parser.add_argument("--tasks", type=int, default=200, help="tasks per project")
+    parser.add_argument("--comments", type=int, default=3, help="comments per task")
+    parser.add_argument("--notifications", type=int, default=50, help="notifications for the benchmark user")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--only", help="comma separated scenario names")
+    parser.add_argument("--save-baseline", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
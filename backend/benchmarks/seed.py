@@ -0,0 +1,122 @@
+"""Synthetic dataset for the benchmark suite."""
+import random
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from passlib.context import CryptContext
+
+BENCH_PASSWORD = "benchmark-password"
+STATUSES = ["pending", "in-progress", "completed", "cancelled"]
+
+
+async def _insert(collection, docs, chunk=5000):
+    for start in range(0, len(docs), chunk):
+        await collection.insert_many(docs[start:start + chunk], ordered=False)
+
+
+async def seed(db, orgs=2, users=200, projects=20, members=25, tasks=200, comments=3, notifications=50,
+               rounds=4, rng_seed=42) -> dict:
+    """Fill db with a reproducible dataset; user 0 is a member (manager) of every project"""
+    rng = random.Random(rng_seed)
+    now = datetime.now(timezone.utc)
+    # One hash shared by everybody: seeding should not spend minutes in bcrypt
+    password_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash(BENCH_PASSWORD)
+
+    org_docs = [{"_id": ObjectId(), "name": f"org-{i}", "created_at": now} for i in range(orgs)]
+    user_docs = [{
+        "_id": ObjectId(),
+        "username": f"user{i:05d}",
+        "username_lower": f"user{i:05d}",
+        "email": f"user{i:05d}@bench.example",
+        "password_hash": password_hash,
+        "created_at": now,
+        "is_active": True,
+        "last_login": None,
+        "organizations": [rng.choice(org_docs)["_id"]],
+    } for i in range(users)]
+    for org in org_docs:
+        org["owner_id"] = user_docs[0]["_id"]
+    owner = user_docs[0]
+
+    project_docs, task_docs, comment_docs = [], [], []
+    for p in range(projects):
+        others = rng.sample(user_docs[1:-1], min(members - 1, len(user_docs) - 2))
+        project_id = ObjectId()
+        project_tasks = []
+        for t in range(tasks):
+            task_status = rng.choice(STATUSES)
+            task_id = ObjectId()
+            project_tasks.append({
+                "_id": task_id,
+                "title": f"Task {t} of project {p}",
+                "description": f"Synthetic task {t} for benchmarking search and listing",
+                "status": task_status,
+                "project_id": project_id,
+                "creator_id": owner["_id"],
+                "assignee_id": str(rng.choice(others)["_id"]) if others else None,
+                "created_at": now - timedelta(minutes=tasks - t),
+                "comment_count": comments,
+            })
+            if comments:
+                project_tasks[-1]["last_comment_at"] = now - timedelta(seconds=1)
+            comment_docs += [{
+                "_id": ObjectId(),
+                "task_id": task_id,
+                "author_id": rng.choice(others or [owner])["_id"],
+                "content": f"Comment {c} on task {t}",
+                "created_at": now - timedelta(seconds=comments - c),
+            } for c in range(comments)]
+        completed = sum(1 for task in project_tasks if task["status"] == "completed")
+        project_docs.append({
+            "_id": project_id,
+            "name": f"Project {p}",
+            "description": "Synthetic benchmark project",
+            "organization_id": rng.choice(org_docs)["_id"],
+            "owner_id": owner["_id"],
+            "status": "active",
+            "priority": "medium",
+            "members": [{"user_id": owner["_id"], "role": "manager", "added_at": now}] + [
+                {"user_id": u["_id"], "role": rng.choice(["contributor", "viewer"]), "added_at": now} for u in others
+            ],
+            "metadata": {"start_date": now, "end_date": None, "tags": ["bench"]},
+            "progress": {
+                "completion_percentage": round(completed / len(project_tasks) * 100, 1) if project_tasks else 0,
+                "tasks_total": len(project_tasks),
+                "tasks_completed": completed,
+            },
+            "created_at": now,
+            "updated_at": now,
+        })
+        task_docs += project_tasks
+
+    notification_docs = [{
+        "_id": ObjectId(),
+        "user_id": owner["_id"],
+        "type": "task_assigned",
+        "task_id": rng.choice(task_docs)["_id"] if task_docs else None,
+        "message": f"Notification {n}",
+        "read": rng.random() < 0.5,
+        "created_at": now - timedelta(seconds=n),
+    } for n in range(notifications)]
+
+    await _insert(db.organizations, org_docs)
+    await _insert(db.users, user_docs)
+    await _insert(db.projects, project_docs)
+    await _insert(db.tasks, task_docs)
+    await _insert(db.comments, comment_docs)
+    await _insert(db.notifications, notification_docs)
+    await db.notification_counters.insert_one(
+        {"_id": owner["_id"], "unread": sum(1 for n in notification_docs if not n["read"])}
+    )
+
+    return {
+        "user": owner,
+        "user_ids": [u["_id"] for u in user_docs],
+        "project_ids": [p["_id"] for p in project_docs],
+        "task_ids": [t["_id"] for t in task_docs],
+        "notification_ids": [n["_id"] for n in notification_docs],
+        "counts": {
+            "organizations": len(org_docs), "users": len(user_docs), "projects": len(project_docs),
+            "tasks": len(task_docs), "comments": len(comment_docs), "notifications": len(notification_docs),
+        },
+    }
@@ -0,0 +1,114 @@
+"""Micro-benchmark of response serialisation for list endpoints.
+
+Compares the model path (TaskOut/CommentOut per document, jsonable_encoder,
+then JSONResponse) with the FastJSONResponse path (plain dicts rendered in
+one pass), with and without orjson.
+
+    cd backend
+    python -m benchmarks.serialization --docs 5000 --repeat 20
+
+For the end-to-end effect, run benchmarks.run once with FAST_JSON=false and
+once with the default.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+
+
+def make_tasks(count):
+    project_id, creator_id = ObjectId(), ObjectId()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)  # Mongo hands back naive UTC
+    return [{
+        "_id": ObjectId(),
+        "title": f"Task {i}",
+        "description": f"Synthetic task {i} for the serialisation benchmark",
+        "status": "completed" if i % 3 == 0 else "pending",
+        "project_id": project_id,
+        "creator_id": creator_id,
+        "assignee_id": str(ObjectId()) if i % 2 else None,
+        "created_at": now - timedelta(seconds=i),
+    } for i in range(count)]
+
+
+def make_comments(count):
+    task_id = ObjectId()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return [{
+        "_id": ObjectId(),
+        "task_id": task_id,
+        "author_id": ObjectId(),
+        "content": f"Comment {i} with a little more text than a title",
+        "created_at": now - timedelta(seconds=i),
+    } for i in range(count)]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+
+def run(docs, repeat):
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:1")
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    import main as app_module
+    import serialization
+
+    def stdlib_dumps(content):
+        # What FastJSONResponse does when orjson is not installed
+        return json.dumps(content, default=serialization.json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+    cases = {
+        "tasks": (make_tasks(docs), app_module.task_doc_to_out, app_module.task_doc_to_dict),
+        "comments": (make_comments(docs), app_module.comment_doc_to_out, app_module.comment_doc_to_dict),
+    }
+    results = {}
+    for name, (documents, to_model, to_dict) in cases.items():
+        variants = {
+            "models+jsonable_encoder": lambda: JSONResponse(jsonable_encoder([to_model(d) for d in documents])).body,
+            "dicts+json": lambda: stdlib_dumps([to_dict(d) for d in documents]),
+        }
+        if serialization.orjson is not None:
+            variants["dicts+orjson"] = lambda: serialization.FastJSONResponse([to_dict(d) for d in documents]).body
+        baseline = None
+        for variant, fn in variants.items():
+            seconds, size = best_of(fn, repeat)
+            baseline = baseline or seconds
+            results[f"{name}/{variant}"] = {
+                "ms": round(seconds * 1000, 3),
+                "us_per_doc": round(seconds * 1e6 / docs, 3),
+                "bytes": size,
+                "speedup": round(baseline / seconds, 2),
+            }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000, help="documents per response")
+    parser.add_argument("--repeat", type=int, default=10, help="best of this many runs")
+    args = parser.parse_args(argv)
+
+    results = run(args.docs, args.repeat)
+    header = f"{'case':<36}{'ms':>10}{'us/doc':>10}{'bytes':>10}{'speedup':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<36}{r['ms']:>10}{r['us_per_doc']:>10}{r['bytes']:>10}{r['speedup']:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache with a per-entry TTL and tag based invalidation.
+
+    Not thread safe: it is only touched from the event loop.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[Hashable] = (), ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        if key in self._data:
+            self._drop(key)
+        tags = tuple(tags)
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.maxsize:
+            oldest = next(iter(self._data))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        if key in self._data:
+            self._drop(key)
+
+    def invalidate_tag(self, tag: Hashable):
+        for key in list(self._tags.get(tag, ())):
+            self._drop(key)
+
+    def clear(self):
+        self._data.clear()
+        self._tags.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _drop(self, key: Hashable):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RecentItems:
+    """The newest items per key, each key a bounded list kept newest first.
+
+    push() records an item as soon as this process produces it. A key is only
+    served after fill() has merged in the newest items from the database, and
+    for ttl seconds after that, so items written by other processes appear
+    within ttl. Keys are evicted LRU beyond maxkeys.
+    """
+
+    def __init__(self, maxlen: int = 50, maxkeys: int = 1000, ttl: float = 30.0, id_key: str = "_id"):
+        self.maxlen = maxlen
+        self.maxkeys = maxkeys
+        self.ttl = ttl
+        self.id_key = id_key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> [filled_until, items newest first, complete]; complete means no older items exist
+        self._data: "OrderedDict[Hashable, list]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        """(items, complete) while the key is filled and fresh, else MISSING"""
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def push(self, key: Hashable, item: Any):
+        if self.maxkeys <= 0:
+            return
+        entry = self._entry(key)
+        entry[1].insert(0, item)
+        if len(entry[1]) > self.maxlen:
+            del entry[1][self.maxlen:]
+            entry[2] = False
+
+    def fill(self, key: Hashable, items: list, complete: bool):
+        """Merge the newest items from the database (newest first) with the ones pushed here"""
+        if self.maxkeys <= 0:
+            return
+        entry = self._entry(key)
+        merged = {item[self.id_key]: item for item in items}
+        for item in entry[1]:
+            merged.setdefault(item[self.id_key], item)
+        ordered = sorted(merged.values(), key=lambda item: item[self.id_key], reverse=True)
+        entry[0] = time.monotonic() + self.ttl
+        entry[1] = ordered[:self.maxlen]
+        entry[2] = complete and len(ordered) <= self.maxlen
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def _entry(self, key: Hashable) -> list:
+        entry = self._data.get(key)
+        if entry is None:
+            entry = self._data[key] = [0.0, [], False]
+            while len(self._data) > self.maxkeys:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        self._data.move_to_end(key)
+        return entry
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "keys": len(self._data),
+            "maxkeys": self.maxkeys,
+            "maxlen": self.maxlen,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,215 @@
+"""Background cascading deletes that survive restarts.
+
+A route that deletes something with children submits a job to the
+deletion_jobs collection and returns. Every worker runs a DeletionJobs loop
+that claims queued jobs under a lease, runs the handler registered for the
+job's kind and records its progress on the job document:
+
+- Handlers remove children through DeletionContext.delete_in_batches, which
+  deletes at most batch_size documents per delete_many, pauses between
+  batches so the cascade does not crowd out live traffic, and renews the
+  lease with each progress update.
+- Handlers delete by query, so running one again after a crash just carries
+  on with whatever is left. A job whose worker died is picked up by another
+  one once its lease runs out.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger("synergysphere.deletion")
+
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", "500"))
+DELETION_BATCH_PAUSE_SECONDS = float(os.getenv("DELETION_BATCH_PAUSE_SECONDS", "0.05"))
+DELETION_LEASE_SECONDS = float(os.getenv("DELETION_LEASE_SECONDS", "60"))
+DELETION_POLL_SECONDS = float(os.getenv("DELETION_POLL_SECONDS", "10"))
+DELETION_MAX_ATTEMPTS = int(os.getenv("DELETION_MAX_ATTEMPTS", "5"))
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job"""
+
+
+class DeletionContext:
+    """What a handler gets: batched deletes that report progress on the job"""
+
+    def __init__(self, jobs: "DeletionJobs", job: dict):
+        self.jobs = jobs
+        self.job = job
+
+    async def delete_in_batches(self, label: str, collection, query: dict,
+                                before_batch: Optional[Callable[[List], Awaitable]] = None) -> int:
+        """Delete everything matching query, batch_size documents at a time.
+
+        before_batch is awaited with each batch's _ids before it is deleted,
+        for children of the batch that have to go first.
+        """
+        deleted = 0
+        while True:
+            ids = [doc["_id"] async for doc in collection.find(query, {"_id": 1}).limit(self.jobs.batch_size)]
+            if not ids:
+                return deleted
+            if before_batch is not None:
+                await before_batch(ids)
+            result = await collection.delete_many({"_id": {"$in": ids}})
+            deleted += result.deleted_count
+            await self.jobs._progress(self.job, {f"deleted.{label}": result.deleted_count})
+            if self.jobs.pause:
+                await asyncio.sleep(self.jobs.pause)
+
+
+class DeletionJobs:
+    def __init__(self, get_collection: Callable, batch_size: int = DELETION_BATCH_SIZE,
+                 pause: float = DELETION_BATCH_PAUSE_SECONDS, lease: float = DELETION_LEASE_SECONDS,
+                 poll_interval: float = DELETION_POLL_SECONDS, max_attempts: int = DELETION_MAX_ATTEMPTS):
+        self.get_collection = get_collection
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.worker_id = uuid.uuid4().hex
+        self.handlers: Dict[str, Callable[[DeletionContext, dict], Awaitable]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.completed = 0
+        self.failed = 0
+
+    def handler(self, kind: str):
+        """Decorator registering the coroutine that runs jobs of this kind"""
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    async def submit(self, kind: str, target_ids: list, requested_by=None) -> dict:
+        now = datetime.now(timezone.utc)
+        job = {
+            "_id": uuid.uuid4().hex,
+            "kind": kind,
+            "target_ids": target_ids,
+            "requested_by": requested_by,
+            "status": "queued",
+            "deleted": {},
+            "attempts": 0,
+            "error": None,
+            "worker": None,
+            "lease_until": now,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+        }
+        await self.get_collection().insert_one(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.get_collection().find_one({"_id": job_id})
+
+    async def find_active(self, kind: str, target_id) -> Optional[dict]:
+        return await self.get_collection().find_one(
+            {"kind": kind, "target_ids": target_id, "status": {"$in": ["queued", "running"]}}
+        )
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await self.get_collection().find_one_and_update(
+            {"status": {"$in": ["queued", "running"]}, "lease_until": {"$lte": now}},
+            {"$set": {"status": "running", "worker": self.worker_id,
+                      "lease_until": now + timedelta(seconds=self.lease), "updated_at": now}},
+            sort=[("lease_until", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _progress(self, job: dict, inc: dict):
+        now = datetime.now(timezone.utc)
+        result = await self.get_collection().update_one(
+            {"_id": job["_id"], "worker": self.worker_id},
+            {"$inc": inc, "$set": {"lease_until": now + timedelta(seconds=self.lease), "updated_at": now}},
+        )
+        if result.matched_count == 0:
+            raise LeaseLost(job["_id"])
+
+    async def _finish(self, job: dict, update: dict):
+        now = datetime.now(timezone.utc)
+        await self.get_collection().update_one(
+            {"_id": job["_id"], "worker": self.worker_id}, {"$set": {**update, "updated_at": now}}
+        )
+
+    async def run_job(self, job: dict):
+        handler = self.handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for deletion jobs of kind {job['kind']!r}")
+            await handler(DeletionContext(self, job), job)
+        except LeaseLost:
+            logger.warning("Deletion job %s was taken over by another worker", job["_id"])
+            return
+        except asyncio.CancelledError:
+            # Shutting down: hand the job straight back instead of waiting out the lease
+            await self._finish(job, {"lease_until": datetime.now(timezone.utc)})
+            raise
+        except Exception as exc:
+            attempts = job["attempts"] + 1
+            logger.exception("Deletion job %s failed (attempt %d)", job["_id"], attempts)
+            if attempts >= self.max_attempts:
+                self.failed += 1
+                await self._finish(job, {"status": "failed", "error": str(exc), "attempts": attempts,
+                                         "finished_at": datetime.now(timezone.utc)})
+            else:
+                # Back off by one lease, then any worker may retry it
+                retry_at = datetime.now(timezone.utc) + timedelta(seconds=self.lease)
+                await self._finish(job, {"status": "queued", "error": str(exc), "attempts": attempts,
+                                         "lease_until": retry_at})
+            return
+        self.completed += 1
+        await self._finish(job, {"status": "done", "error": None, "finished_at": datetime.now(timezone.utc)})
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Claiming a deletion job failed")
+                job = None
+            if job is not None:
+                await self.run_job(job)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop claiming; an interrupted job is resumed by whoever claims it after its lease"""
+        if self._task is not None:
+            # The flag ends the loop even if the cancel is swallowed by a wait_for
+            # that completed at the same moment (Python < 3.12)
+            self._stopping = True
+            self._wakeup.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"worker": self.worker_id, "running": self._task is not None,
+                "completed": self.completed, "failed": self.failed}
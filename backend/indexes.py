@@ -0,0 +1,243 @@
+"""Index declarations for the queries main.py runs, plus a startup verifier.
+
+Run directly for a report of which registered query shapes fall back to a
+collection scan:
+
+    python indexes.py            # report only
+    python indexes.py --apply    # create missing indexes first
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+logger = logging.getLogger("synergysphere.indexes")
+
+# Read notifications are removed this long after read_at; unread ones are kept.
+# Changing it needs a collMod (or dropping idx_notifications_read_ttl): ensure_indexes only compares keys.
+NOTIFICATION_READ_TTL_DAYS = float(os.getenv("NOTIFICATION_READ_TTL_DAYS", "30"))
+# Delete tombstones for /changes; a client that has not synced for longer should reload the project
+CHANGES_TOMBSTONE_TTL_DAYS = float(os.getenv("CHANGES_TOMBSTONE_TTL_DAYS", "30"))
+# Project activity feed events are kept this long
+ACTIVITY_TTL_DAYS = float(os.getenv("ACTIVITY_TTL_DAYS", "90"))
+
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="idx_users_email_unique"),
+        IndexModel([("username", ASCENDING)], unique=True, name="idx_users_username_unique"),
+        IndexModel([("username_lower", ASCENDING)], name="idx_users_username_lower"),
+        IndexModel([("created_at", DESCENDING)], name="idx_users_created_at"),
+    ],
+    "organizations": [
+        IndexModel([("owner_id", ASCENDING)], name="idx_organizations_owner"),
+    ],
+    "projects": [
+        # list_projects / dashboard / search scope: members.user_id, paged by _id
+        IndexModel([("members.user_id", ASCENDING), ("_id", ASCENDING)], name="idx_projects_member"),
+        IndexModel([("organization_id", ASCENDING), ("status", ASCENDING)], name="idx_projects_org_status"),
+        IndexModel([("owner_id", ASCENDING)], name="idx_projects_owner"),
+    ],
+    "tasks": [
+        IndexModel([("project_id", ASCENDING), ("status", ASCENDING)], name="idx_tasks_project_status"),
+        # list_project_tasks pages and the NDJSON export walk a project's tasks by _id
+        IndexModel([("project_id", ASCENDING), ("_id", ASCENDING)], name="idx_tasks_project_id"),
+        IndexModel([("title", TEXT), ("description", TEXT)], name="idx_tasks_text_search"),
+        # /changes: a project's tasks written after a version
+        IndexModel([("project_id", ASCENDING), ("version", ASCENDING)], name="idx_tasks_project_version"),
+    ],
+    "comments": [
+        IndexModel([("task_id", ASCENDING), ("created_at", DESCENDING)], name="idx_comments_task_created"),
+        IndexModel([("task_id", ASCENDING), ("_id", ASCENDING)], name="idx_comments_task_id"),
+        IndexModel([("project_id", ASCENDING), ("version", ASCENDING)], name="idx_comments_project_version"),
+    ],
+    "notifications": [
+        # The app stores the recipient in user_id; idx_notifications_recipient_created, which
+        # older init_db runs created on the schema's recipient_id field, is never used by a query.
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="idx_notifications_user_created"),
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="idx_notifications_user_id"),
+        IndexModel(
+            [("read_at", ASCENDING)],
+            expireAfterSeconds=int(NOTIFICATION_READ_TTL_DAYS * 86400),
+            partialFilterExpression={"read": True},
+            name="idx_notifications_read_ttl",
+        ),
+    ],
+    "rate_limits": [
+        # Shared rate limit buckets (RATE_LIMIT_BACKEND=mongo) drop out once they would be full again
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="idx_rate_limits_expires"),
+    ],
+    "revoked_tokens": [
+        # A revocation can go once the token it covers has expired
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="idx_revoked_tokens_expires"),
+        # Each worker polls for revocations newer than the last it saw
+        IndexModel([("revoked_at", ASCENDING)], name="idx_revoked_tokens_revoked_at"),
+    ],
+    "activity": [
+        # The feed pages a project's events newest first by _id
+        IndexModel([("project_id", ASCENDING), ("_id", DESCENDING)], name="idx_activity_project_id"),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=int(ACTIVITY_TTL_DAYS * 86400), name="idx_activity_ttl"),
+    ],
+    "deletion_jobs": [
+        # Workers claim the unfinished job whose lease ran out longest ago
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="idx_deletion_jobs_claim"),
+        IndexModel([("target_ids", ASCENDING)], name="idx_deletion_jobs_target"),
+    ],
+    "tombstones": [
+        IndexModel([("project_id", ASCENDING), ("version", ASCENDING)], name="idx_tombstones_project_version"),
+        IndexModel(
+            [("deleted_at", ASCENDING)],
+            expireAfterSeconds=int(CHANGES_TOMBSTONE_TTL_DAYS * 86400),
+            name="idx_tombstones_deleted_ttl",
+        ),
+    ],
+}
+
+
+class QueryTemplate:
+    """A query shape a route runs, with sample values, for explain()"""
+
+    def __init__(self, name: str, collection: str, filter: dict, sort: Optional[list] = None):
+        self.name = name
+        self.collection = collection
+        self.filter = filter
+        self.sort = sort
+
+
+_sample_id = ObjectId()
+_sample_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+QUERY_TEMPLATES: List[QueryTemplate] = [
+    QueryTemplate("authenticate_user", "users", {"$or": [{"username": "sample"}, {"email": "sample"}]}),
+    QueryTemplate("search_users", "users", {"username_lower": {"$regex": "^sa"}}, [("username_lower", 1)]),
+    QueryTemplate("list_projects", "projects", {"members.user_id": _sample_id}, [("_id", 1)]),
+    QueryTemplate("list_project_tasks", "tasks", {"project_id": _sample_id}, [("_id", 1)]),
+    QueryTemplate("dashboard_task_counts", "tasks", {"project_id": {"$in": [_sample_id]}, "status": "completed"}),
+    QueryTemplate("search_tasks", "tasks", {"$text": {"$search": "sample"}, "project_id": {"$in": [_sample_id]}}),
+    QueryTemplate("project_changes_tasks", "tasks", {"project_id": _sample_id, "version": {"$gt": 1, "$lte": 2}}, [("version", 1)]),
+    QueryTemplate("project_changes_comments", "comments", {"project_id": _sample_id, "version": {"$gt": 1, "$lte": 2}}, [("version", 1)]),
+    QueryTemplate("project_changes_deleted", "tombstones", {"project_id": _sample_id, "version": {"$gt": 1, "$lte": 2}}, [("version", 1)]),
+    QueryTemplate("refresh_revoked_tokens", "revoked_tokens", {"revoked_at": {"$gte": _sample_time}}, [("revoked_at", 1)]),
+    QueryTemplate("project_activity", "activity", {"project_id": _sample_id, "_id": {"$lt": _sample_id}}, [("_id", -1)]),
+    QueryTemplate("claim_deletion_job", "deletion_jobs", {"status": {"$in": ["queued", "running"]}, "lease_until": {"$lte": _sample_time}}, [("lease_until", 1)]),
+    QueryTemplate("get_task_comments", "comments", {"task_id": _sample_id}, [("created_at", 1)]),
+    QueryTemplate("get_task_comments_page", "comments", {"task_id": _sample_id}, [("_id", -1)]),
+    QueryTemplate("export_task_comments", "comments", {"task_id": _sample_id}, [("_id", 1)]),
+    QueryTemplate("get_notifications", "notifications", {"user_id": _sample_id}, [("created_at", -1)]),
+    QueryTemplate("mark_all_notifications_read", "notifications", {"user_id": _sample_id, "read": False}),
+    QueryTemplate("stream_notifications_replay", "notifications", {"user_id": _sample_id, "_id": {"$gt": _sample_id}}, [("_id", 1)]),
+]
+
+
+def _index_key(spec) -> tuple:
+    key = tuple(spec.items()) if isinstance(spec, dict) else tuple(spec)
+    key = tuple((field, int(d) if isinstance(d, (int, float)) else d) for field, d in key)
+    # Text indexes are reported back as _fts/_ftsx and a collection can only have one
+    if any(direction == TEXT or field == "_fts" for field, direction in key):
+        return ("$text",)
+    return key
+
+
+async def ensure_indexes(db, drop_conflicting: bool = False) -> dict:
+    """Create missing required indexes; report (or replace) same-named ones with a different key"""
+    report = {"created": [], "conflicts": [], "unused": []}
+    for collection_name, models in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        existing = {name: _index_key(info["key"]) for name, info in (await collection.index_information()).items()}
+        wanted = {model.document["name"]: _index_key(model.document["key"]) for model in models}
+        missing = []
+        for model in models:
+            name, key = model.document["name"], wanted[model.document["name"]]
+            if name in existing and existing[name] != key:
+                report["conflicts"].append(f"{collection_name}.{name}")
+                if drop_conflicting:
+                    await collection.drop_index(name)
+                    missing.append(model)
+            elif key not in existing.values():
+                missing.append(model)
+        if missing:
+            await collection.create_indexes(missing)
+            report["created"] += [f"{collection_name}.{m.document['name']}" for m in missing]
+        report["unused"] += [
+            f"{collection_name}.{name}" for name, key in existing.items()
+            if name != "_id_" and key not in wanted.values()
+        ]
+    for name in report["conflicts"]:
+        logger.warning("Index %s exists with a different key%s", name, " and was rebuilt" if drop_conflicting else "")
+    if report["created"]:
+        logger.info("Created indexes: %s", ", ".join(report["created"]))
+    return report
+
+
+def _plan_stages(plan: dict) -> List[str]:
+    stages = []
+    if not isinstance(plan, dict):
+        return stages
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+async def explain_templates(db, templates: List[QueryTemplate] = None) -> List[dict]:
+    results = []
+    for template in templates or QUERY_TEMPLATES:
+        cursor = db[template.collection].find(template.filter)
+        if template.sort:
+            cursor = cursor.sort(template.sort)
+        try:
+            explain = await cursor.limit(1).explain()
+            stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+            error = None
+        except Exception as exc:
+            stages, error = [], str(exc)
+        results.append({
+            "query": template.name,
+            "collection": template.collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages,
+            "error": error,
+        })
+    return results
+
+
+async def verify_query_plans(db, mode: str = "warn") -> List[dict]:
+    """Explain every registered query; warn about or refuse to start on collection scans"""
+    results = await explain_templates(db)
+    unsupported = [r for r in results if r["collscan"] or r["error"]]
+    for r in unsupported:
+        logger.warning("Query %s on %s has no supporting index (%s)", r["query"], r["collection"],
+                       r["error"] or " > ".join(r["stages"]))
+    if unsupported and mode == "fail":
+        raise RuntimeError("Queries without a supporting index: " + ", ".join(r["query"] for r in unsupported))
+    return results
+
+
+async def _main(apply: bool):
+    from init_db import connect, db
+    connect()
+    if apply:
+        report = await ensure_indexes(db)
+        print("created:", ", ".join(report["created"]) or "-")
+        print("conflicts:", ", ".join(report["conflicts"]) or "-")
+        print("unused:", ", ".join(report["unused"]) or "-")
+    results = await explain_templates(db)
+    width = max(len(r["query"]) for r in results)
+    for r in results:
+        flag = "COLLSCAN" if r["collscan"] else ("ERROR" if r["error"] else "ok")
+        detail = r["error"] or " > ".join(r["stages"])
+        print(f"{r['query']:<{width}}  {flag:<8}  {r['collection']}: {detail}")
+    return any(r["collscan"] for r in results)
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(_main("--apply" in sys.argv)) else 0)
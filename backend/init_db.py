@@ -1,20 +1,112 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import ASCENDING, DESCENDING
 import os
 import asyncio
-from pymongo import ASCENDING, DESCENDING, TEXT
 from bson import ObjectId
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from pymongo import read_preferences
+from indexes import ensure_indexes
+from instrumentation import db_listener, pool_listener
 
 load_dotenv() 
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME", "synergysphere")
-
-client = AsyncIOMotorClient(MONGO_URI)
-db = client[DB_NAME]
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+# How long a request waits for a free pooled connection before failing
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")  # e.g. "zstd,snappy,zlib"; unavailable ones are skipped
+# Read preference for read_db, used by routes that tolerate replication lag
+MONGO_READ_ONLY_PREFERENCE = os.getenv("MONGO_READ_ONLY_PREFERENCE", "primary")
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", "-1"))
+
+READ_PREFERENCES = {
+    "primary": read_preferences.Primary,
+    "primaryPreferred": read_preferences.PrimaryPreferred,
+    "secondary": read_preferences.Secondary,
+    "secondaryPreferred": read_preferences.SecondaryPreferred,
+    "nearest": read_preferences.Nearest,
+}
+
+
+class _DatabaseProxy:
+    """Stands in for the Motor database until connect() (or a test's bind()) supplies one.
+
+    Modules keep `from init_db import db`; the client itself is created inside
+    the FastAPI lifespan, after uvicorn has forked its workers.
+    """
+    __slots__ = ("_name", "_target")
+
+    def __init__(self, name):
+        self._name = name
+        self._target = None
+
+    def _database(self):
+        if self._target is None:
+            raise RuntimeError(f"init_db.{self._name} used before init_db.connect()")
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._database(), name)
+
+    def __getitem__(self, name):
+        return self._database()[name]
+
+
+client = None
+db = _DatabaseProxy("db")
+read_db = _DatabaseProxy("read_db")
+
+def read_preference(mode: str):
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference {mode!r}; expected one of {', '.join(READ_PREFERENCES)}")
+    if mode == "primary":
+        return read_preferences.Primary()
+    return READ_PREFERENCES[mode](max_staleness=MONGO_MAX_STALENESS_SECONDS)
+
+def client_options() -> dict:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "event_listeners": [db_listener, pool_listener],
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+def bind(database, read_database=None):
+    """Point db/read_db at an existing database object (benchmarks, tests)"""
+    db._target = database
+    read_db._target = read_database if read_database is not None else database
+
+def connect() -> bool:
+    """Create the client unless a database is already bound; True if this call created it"""
+    global client
+    if db._target is not None:
+        return False
+    client = AsyncIOMotorClient(MONGO_URI, **client_options())
+    bind(
+        client[DB_NAME],
+        client.get_database(DB_NAME, read_preference=read_preference(MONGO_READ_ONLY_PREFERENCE)),
+    )
+    return True
+
+def close():
+    global client
+    if client is not None:
+        client.close()
+        client = None
+    db._target = read_db._target = None
 
 async def init_db():
+    connect()
     print("Connected to DB:", db.name)
     # USERS COLLECTION
     await db.create_collection("users", validator={
@@ -30,11 +122,6 @@ async def init_db():
         }
     })
 
-    # Indexes
-    await db.users.create_index("email", unique=True, name="idx_users_email_unique")
-    await db.users.create_index("username", unique=True, name="idx_users_username_unique")
-    await db.users.create_index([("created_at", DESCENDING)], name="idx_users_created_at")
-
     # ORGANIZATIONS COLLECTION
     await db.create_collection("organizations", validator={
         "$jsonSchema": {
@@ -48,8 +135,6 @@ async def init_db():
         }
     })
 
-    await db.organizations.create_index("owner_id", name="idx_organizations_owner")
-
     await db.command("collMod", "projects", validator={
     "$jsonSchema": {
         "bsonType": "object",
@@ -65,9 +150,6 @@ async def init_db():
     }
 })
 
-    await db.projects.create_index([("organization_id", ASCENDING), ("status", ASCENDING)], name="idx_projects_org_status")
-    await db.projects.create_index("owner_id", name="idx_projects_owner")
-
     # TASKS COLLECTION
     await db.create_collection("tasks", validator={
         "$jsonSchema": {
@@ -82,9 +164,6 @@ async def init_db():
         }
     })
 
-    await db.tasks.create_index([("project_id", ASCENDING), ("status", ASCENDING)], name="idx_tasks_project_status")
-    await db.tasks.create_index([("title", TEXT), ("description", TEXT)], name="idx_tasks_text_search")
-
     # COMMENTS COLLECTION
     await db.create_collection("comments", validator={
         "$jsonSchema": {
@@ -98,8 +177,6 @@ async def init_db():
         }
     })
 
-    await db.comments.create_index([("task_id", ASCENDING), ("created_at", DESCENDING)], name="idx_comments_task_created")
-
     # NOTIFICATIONS COLLECTION
     await db.create_collection("notifications", validator={
         "$jsonSchema": {
@@ -115,7 +192,9 @@ async def init_db():
         }
     })
 
-    await db.notifications.create_index([("recipient_id", ASCENDING), ("created_at", DESCENDING)], name="idx_notifications_recipient_created")
+    # Indexes are declared in indexes.py, which the app also applies at startup
+    report = await ensure_indexes(db)
+    print("Indexes created:", ", ".join(report["created"]) or "-")
 
     # Insert Sample Data
     sample_user_id = ObjectId()
@@ -0,0 +1,338 @@
+"""Per-request latency, MongoDB and serialisation accounting.
+
+- InstrumentationMiddleware times every request, adds a Server-Timing header
+  and logs requests slower than SLOW_REQUEST_MS.
+- db_listener is a pymongo CommandListener that charges each command to the
+  request that issued it (Motor copies context variables into its worker
+  threads); pool_listener keeps connection pool counters.
+- span()/timed() time sections of code such as the serialisers.
+- metrics.render() produces the Prometheus text served at /metrics.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger("synergysphere.slow")
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestStats:
+    __slots__ = ("db_calls", "db_seconds", "spans", "_lock")
+
+    def __init__(self):
+        self.db_calls = 0
+        self.db_seconds = 0.0
+        self.spans: Dict[str, list] = {}  # name -> [calls, seconds]
+        self._lock = threading.Lock()
+
+    def add_db(self, seconds: float):
+        with self._lock:
+            self.db_calls += 1
+            self.db_seconds += seconds
+
+    def add_span(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, str], Histogram] = {}
+        self.request_db: Dict[Tuple[str, str], list] = {}  # (method, route) -> [calls, seconds]
+        self.spans: Dict[str, list] = {}
+        self.commands: Dict[str, list] = {}  # command name -> [calls, failures, seconds]
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            key = (method, route, str(status))
+            histogram = self.requests.get(key)
+            if histogram is None:
+                histogram = self.requests[key] = Histogram()
+            histogram.observe(seconds)
+            db = self.request_db.setdefault((method, route), [0, 0.0])
+            db[0] += stats.db_calls
+            db[1] += stats.db_seconds
+            for name, (calls, span_seconds) in stats.spans.items():
+                entry = self.spans.setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += span_seconds
+
+    def observe_command(self, name: str, seconds: float, failed: bool):
+        with self._lock:
+            entry = self.commands.setdefault(name, [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += int(failed)
+            entry[2] += seconds
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP synergysphere_request_duration_seconds Request latency by route",
+                "# TYPE synergysphere_request_duration_seconds histogram",
+            ]
+            for (method, route, status), h in sorted(self.requests.items()):
+                labels = f'method="{method}",route="{route}",status="{status}"'
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'synergysphere_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'synergysphere_request_duration_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"synergysphere_request_duration_seconds_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"synergysphere_request_duration_seconds_count{{{labels}}} {h.count}")
+            lines += [
+                "# HELP synergysphere_request_db_calls_total MongoDB commands issued by route",
+                "# TYPE synergysphere_request_db_calls_total counter",
+            ]
+            lines += [
+                f'synergysphere_request_db_calls_total{{method="{m}",route="{r}"}} {calls}'
+                for (m, r), (calls, _) in sorted(self.request_db.items())
+            ]
+            lines += [
+                "# HELP synergysphere_request_db_seconds_total Time spent in MongoDB commands by route",
+                "# TYPE synergysphere_request_db_seconds_total counter",
+            ]
+            lines += [
+                f'synergysphere_request_db_seconds_total{{method="{m}",route="{r}"}} {seconds:.6f}'
+                for (m, r), (_, seconds) in sorted(self.request_db.items())
+            ]
+            lines += [
+                "# HELP synergysphere_span_seconds_total Time spent in instrumented sections",
+                "# TYPE synergysphere_span_seconds_total counter",
+            ]
+            for name, (calls, seconds) in sorted(self.spans.items()):
+                lines.append(f'synergysphere_span_seconds_total{{span="{name}"}} {seconds:.6f}')
+                lines.append(f'synergysphere_span_calls_total{{span="{name}"}} {calls}')
+            lines += [
+                "# HELP synergysphere_mongo_commands_total MongoDB commands by name",
+                "# TYPE synergysphere_mongo_commands_total counter",
+            ]
+            for name, (calls, failures, seconds) in sorted(self.commands.items()):
+                lines.append(f'synergysphere_mongo_commands_total{{command="{name}"}} {calls}')
+                lines.append(f'synergysphere_mongo_command_failures_total{{command="{name}"}} {failures}')
+                lines.append(f'synergysphere_mongo_command_seconds_total{{command="{name}"}} {seconds:.6f}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class DBCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed: bool):
+        seconds = event.duration_micros / 1e6
+        metrics.observe_command(event.command_name, seconds, failed)
+        stats = _current.get()
+        if stats is not None:
+            stats.add_db(seconds)
+
+
+db_listener = DBCommandListener()
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server address, for the health endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools: Dict[str, dict] = {}
+
+    def _pool(self, address) -> dict:
+        name = "%s:%s" % address if isinstance(address, tuple) else str(address)
+        pool = self.pools.get(name)
+        if pool is None:
+            pool = self.pools[name] = {
+                "open": 0, "in_use": 0, "created": 0, "closed": 0, "cleared": 0,
+                "checkouts": 0, "checkout_failures": 0, "wait_queue_timeouts": 0, "checkout_wait_seconds": 0.0,
+            }
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pool(event.address).update(open=0, in_use=0)
+
+    def connection_created(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["created"] += 1
+            pool["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["closed"] += 1
+            pool["open"] = max(0, pool["open"] - 1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checkout_failures"] += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                pool["wait_queue_timeouts"] += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checkouts"] += 1
+            pool["in_use"] += 1
+            pool["checkout_wait_seconds"] += getattr(event, "duration", 0.0) or 0.0
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["in_use"] = max(0, pool["in_use"] - 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {**pool, "checkout_wait_seconds": round(pool["checkout_wait_seconds"], 6)}
+                for name, pool in self.pools.items()
+            }
+
+
+pool_listener = PoolListener()
+
+
+@contextmanager
+def span(name: str):
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_span(name, time.perf_counter() - start)
+
+
+def timed(name: str):
+    """Decorator version of span() for synchronous helpers"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            stats = _current.get()
+            if stats is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats.add_span(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _route_name(scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        return getattr(endpoint, "__name__", "unknown")
+    return "unmatched"
+
+
+def server_timing_value(total_seconds: float, stats: RequestStats) -> str:
+    parts = [f"app;dur={total_seconds * 1000:.1f}", f'db;desc="{stats.db_calls} calls";dur={stats.db_seconds * 1000:.1f}']
+    parts += [f"{name};dur={seconds * 1000:.1f}" for name, (_, seconds) in stats.spans.items()]
+    return ", ".join(parts)
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware, so streaming responses and context variables keep working"""
+
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_seconds = slow_request_ms / 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing_value(time.perf_counter() - start, stats).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            route = _route_name(scope)
+            metrics.observe_request(scope["method"], route, status_code, elapsed, stats)
+            if elapsed >= self.slow_request_seconds:
+                logger.warning(
+                    "Slow request %s %s -> %s in %.1f ms (db: %d calls, %.1f ms; %s)",
+                    scope["method"], route, status_code, elapsed * 1000, stats.db_calls, stats.db_seconds * 1000,
+                    ", ".join(f"{n}: {s * 1000:.1f} ms" for n, (_, s) in stats.spans.items()) or "no spans",
+                )
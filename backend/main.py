@@ -1,22 +1,45 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Body, Path
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import secrets
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, status, Body, Path, Response, Request, Header
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from bson import ObjectId
-from init_db import db
+import init_db
+from init_db import db, read_db
 import os
 from dotenv import load_dotenv
 from fastapi.security import OAuth2PasswordBearer
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from fastapi import Path
 from fastapi import Query
 from bson.errors import InvalidId
-from pymongo import ReturnDocument 
+from pymongo import ReturnDocument, UpdateOne, InsertOne
+from pymongo.errors import BulkWriteError
+from caches import RecentItems, TTLCache, MISSING
+from passwords import PasswordHasher, PasswordPoolBusy
+from realtime import NotificationHub, CLOSE, watch_inserts
+from revocation import RevocationList
+from batching import BatchWriter, CoalescingBatchWriter, DeltaBuffer
+from deletion import DeletionJobs
+from indexes import ensure_indexes, verify_query_plans
+from instrumentation import InstrumentationMiddleware, metrics, pool_listener, span, timed
+from serialization import FAST_JSON, FastJSONResponse, dumps
+from ratelimit import (
+    RATE_LIMIT_BACKEND, AdmissionController, AdmissionControlMiddleware, Limit, MemoryBackend, MongoBackend,
+    RateLimiter, client_ip, parse_limit, retry_after_header,
+)
 
 load_dotenv()
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 
 
 # Allow all origins
@@ -29,9 +52,105 @@ SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+NOTIFICATION_STREAM_KEEPALIVE_SECONDS = float(os.getenv("NOTIFICATION_STREAM_KEEPALIVE_SECONDS", "15"))
+NOTIFICATION_REPLAY_LIMIT = int(os.getenv("NOTIFICATION_REPLAY_LIMIT", "500"))
+# Publish from a MongoDB change stream so all workers see every notification
+NOTIFICATION_CHANGE_STREAM = os.getenv("NOTIFICATION_CHANGE_STREAM", "false").lower() in ("1", "true", "yes")
+# Create missing indexes on startup, then explain() the registered query shapes: off | warn | fail
+ENSURE_INDEXES = os.getenv("ENSURE_INDEXES", "true").lower() in ("1", "true", "yes")
+INDEX_VERIFY = os.getenv("INDEX_VERIFY", "warn")
+TASK_SEARCH_CACHE_SIZE = int(os.getenv("TASK_SEARCH_CACHE_SIZE", "256"))  # 0 disables the cache
+TASK_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("TASK_SEARCH_CACHE_TTL_SECONDS", "30"))
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "200"))
+# Max time a notification waits in the write buffer; also the window in which duplicates are merged
+NOTIFICATION_FLUSH_INTERVAL = float(os.getenv("NOTIFICATION_FLUSH_INTERVAL", "1.0"))
+PROJECT_ACL_CACHE_TTL_SECONDS = float(os.getenv("PROJECT_ACL_CACHE_TTL_SECONDS", "30"))
+PROJECT_ACL_CACHE_MAX_SIZE = int(os.getenv("PROJECT_ACL_CACHE_MAX_SIZE", "50000"))
+# Per-route token buckets, "<count>/<second|minute|hour|day>"
+RATE_LIMIT_LOGIN = parse_limit(os.getenv("RATE_LIMIT_LOGIN", "10/minute"))
+RATE_LIMIT_REGISTER = parse_limit(os.getenv("RATE_LIMIT_REGISTER", "5/minute"))
+RATE_LIMIT_REFRESH = parse_limit(os.getenv("RATE_LIMIT_REFRESH", "30/minute"))
+RATE_LIMIT_SEARCH = parse_limit(os.getenv("RATE_LIMIT_SEARCH", "60/minute"))
+# /changes re-sends this many versions before ?since=, covering writes that took a version but landed late
+CHANGES_OVERLAP_VERSIONS = int(os.getenv("CHANGES_OVERLAP_VERSIONS", "20"))
+CHANGES_MAX_RESULTS = int(os.getenv("CHANGES_MAX_RESULTS", "1000"))
+ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", "500"))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "1.0"))
+# Newest events kept in memory per project, for how many projects, and how long before re-reading Mongo
+ACTIVITY_RECENT_SIZE = int(os.getenv("ACTIVITY_RECENT_SIZE", "100"))
+ACTIVITY_RECENT_PROJECTS = int(os.getenv("ACTIVITY_RECENT_PROJECTS", "1000"))  # 0 disables it
+ACTIVITY_RECENT_TTL_SECONDS = float(os.getenv("ACTIVITY_RECENT_TTL_SECONDS", "30"))
+# Comma separated user ids allowed to read /api/v1/internal/*; empty keeps those routes closed
+ADMIN_USER_IDS = {user_id.strip() for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+password_hasher = PasswordHasher()
+rate_limiter = RateLimiter(MongoBackend(lambda: db.rate_limits) if RATE_LIMIT_BACKEND == "mongo" else MemoryBackend())
+admission = AdmissionController()
+revoked_tokens = RevocationList(lambda: db.revoked_tokens)
+deletion_jobs = DeletionJobs(lambda: db.deletion_jobs)  # handlers are registered under "Cascading deletes"
+activity_buffer = BatchWriter(lambda: db.activity, max_batch=ACTIVITY_BATCH_SIZE, max_delay=ACTIVITY_FLUSH_INTERVAL)
+activity_recent = RecentItems(
+    maxlen=ACTIVITY_RECENT_SIZE, maxkeys=ACTIVITY_RECENT_PROJECTS, ttl=ACTIVITY_RECENT_TTL_SECONDS
+)
+notification_hub = NotificationHub(queue_size=NOTIFICATION_STREAM_QUEUE_SIZE)
+notification_buffer = CoalescingBatchWriter(
+    lambda: db.notifications,
+    # Same user, same task, same kind of event -> one notification
+    key=lambda n: (n["user_id"], n["task_id"], n["type"]) if n.get("task_id") else None,
+    max_batch=NOTIFICATION_BATCH_SIZE,
+    max_delay=NOTIFICATION_FLUSH_INTERVAL,
+    on_written=lambda docs: notifications_written(docs),
+)
+# Unread badge changes, summed per user and applied on the same schedule as notification writes
+unread_deltas = DeltaBuffer(
+    lambda deltas: apply_unread_deltas(deltas),
+    max_batch=NOTIFICATION_BATCH_SIZE,
+    max_delay=NOTIFICATION_FLUSH_INTERVAL,
+)
 
-app = FastAPI(title="SynergySphere Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The client is created here, per worker process, unless a database was bound already
+    owns_client = init_db.connect()
+    background = []
+    if ENSURE_INDEXES:
+        await ensure_indexes(db)
+    if INDEX_VERIFY != "off":
+        await verify_query_plans(db, INDEX_VERIFY)
+    await backfill_username_lower()
+    await revoked_tokens.start()
+    notification_buffer.start()
+    unread_deltas.start()
+    activity_buffer.start()
+    deletion_jobs.start()
+    if NOTIFICATION_CHANGE_STREAM:
+        background.append(asyncio.create_task(watch_inserts(db.notifications, publish_notification)))
+    yield
+    await deletion_jobs.stop()
+    await notification_buffer.stop()
+    await unread_deltas.stop()  # after notification_buffer, whose flushes add to it
+    await activity_buffer.stop()
+    await revoked_tokens.stop()
+    notification_hub.close()
+    for task in background:
+        task.cancel()
+    password_hasher.shutdown()
+    if owns_client:
+        init_db.close()
+
+app = FastAPI(
+    title="SynergySphere Backend",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse if FAST_JSON else JSONResponse,
+)
+# Inside CORS so rejections still carry the CORS headers; streams would pin a slot for their lifetime
+app.add_middleware(
+    AdmissionControlMiddleware,
+    controller=admission,
+    exempt_prefixes=("/api/v1/health", "/metrics", "/api/v1/notifications/stream"),
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],       # Allow all origins
@@ -39,6 +158,137 @@ app.add_middleware(
     allow_methods=["*"],       # Allow all HTTP methods
     allow_headers=["*"],       # Allow all headers
 )
+app.add_middleware(InstrumentationMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+async def ping_mongo() -> dict:
+    """Ping MongoDB: ok and the round trip time, or the error"""
+    started = time.perf_counter()
+    try:
+        await db.command("ping")
+        return {"ok": True, "ping_ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as exc:
+        return {"ok": False, "error": str(exc)}
+
+@app.get("/api/v1/health")
+async def health(response: Response):
+    """MongoDB reachability, 503 when the ping fails; details are on /api/v1/internal/health"""
+    if not (await ping_mongo())["ok"]:
+        response.status_code = 503
+        return {"status": "unavailable"}
+    return {"status": "ok"}
+
+# -----------------------------
+# Pagination
+# -----------------------------
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(last_id: ObjectId) -> str:
+    """Opaque keyset cursor: the last _id of a page, base64url encoded"""
+    return base64.urlsafe_b64encode(last_id.binary).decode().rstrip("=")
+
+def decode_cursor(token: str) -> ObjectId:
+    try:
+        return ObjectId(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str], allowed: set) -> Optional[dict]:
+    """Turn ?fields=a,b into a Mongo projection, rejecting unknown fields"""
+    if not fields:
+        return None
+    projection = {"_id": 1}
+    for field in fields.split(","):
+        field = field.strip()
+        if not field:
+            continue
+        if field not in allowed:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {field}")
+        projection[field] = 1
+    return projection
+
+async def fetch_page(collection, query: dict, limit: int, after: Optional[str] = None, projection: Optional[dict] = None,
+                     newest_first: bool = False):
+    """Keyset page ordered by _id (which follows created_at); returns (docs, next_cursor)"""
+    if after:
+        query = {**query, "_id": {"$lt" if newest_first else "$gt": decode_cursor(after)}}
+    docs = await collection.find(query, projection).sort("_id", -1 if newest_first else 1).limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+# -----------------------------
+# Conditional GET
+# -----------------------------
+# Project reads are tagged with the project's change version (see advance_project),
+# so a client revalidating an unchanged project gets a 304 without a full read.
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"  # cache, but revalidate every time
+
+def make_etag(*parts) -> str:
+    return 'W/"%s"' % hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag == etag or "W/" + tag == etag:
+            return True
+    return False
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL})
+
+def cacheable_response(content, etag: str, response: Response, serialize):
+    """FastJSONResponse with the ETag, or the serialised content with the ETag set on response"""
+    headers = {"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+    if FAST_JSON:
+        return FastJSONResponse(content, headers=headers)
+    response.headers.update(headers)
+    return serialize(content)
+
+# -----------------------------
+# NDJSON export
+# -----------------------------
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Exports read through init_db.read_db, which may be a secondary (MONGO_READ_ONLY_PREFERENCE)
+
+def parse_checkpoint(after: Optional[str]) -> Optional[ObjectId]:
+    if after is None:
+        return None
+    try:
+        return ObjectId(after)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid checkpoint id")
+
+async def stream_ndjson(collection, query: dict, serialize, batch_size: int, after: Optional[ObjectId] = None,
+                        projection: Optional[dict] = None):
+    """Yield one JSON document per line straight from a cursor, one batch at a time"""
+    if after is not None:
+        query = {**query, "_id": {"$gt": after}}
+    cursor = collection.find(query, projection).sort("_id", 1).batch_size(batch_size)
+    lines = []
+    try:
+        async for doc in cursor:
+            lines.append(dumps(serialize(doc)))
+            if len(lines) >= batch_size:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    finally:
+        await cursor.close()
+
+def ndjson_response(collection, query: dict, serialize, batch_size: int, after: Optional[str],
+                    projection: Optional[dict] = None) -> StreamingResponse:
+    return StreamingResponse(
+        stream_ndjson(collection, query, serialize, batch_size, parse_checkpoint(after), projection),
+        media_type="application/x-ndjson",
+    )
+
 # -----------------------------
 # User Authentication 
 # -----------------------------
@@ -57,36 +307,97 @@ class OrganizationCreate(BaseModel):
 class JoinOrganization(BaseModel):
     organization_id: str  # will convert to ObjectId
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    try:
+        with span("bcrypt"):
+            return await password_hasher.hash(password)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
 
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+async def verify_password(password: str, hashed: str) -> tuple:
+    """Check a password; returns (valid, new_hash) where new_hash is set when the stored hash needs an upgrade"""
+    try:
+        with span("bcrypt"):
+            return await password_hasher.verify_and_update(password, hashed)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    # jti identifies the token for revocation
+    to_encode.update({"exp": expire, "iat": now, "type": "access", "jti": secrets.token_urlsafe(16)})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_refresh_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    to_encode.update({"exp": expire, "iat": now, "type": "refresh", "jti": secrets.token_urlsafe(16)})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def decode_token(token: str, token_type: str) -> dict:
+    """Claims of a valid token of the given type; 401 otherwise"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    # Tokens issued before the type claim was added have none
+    if not payload.get("user_id") or payload.get("type", token_type) != token_type:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+def token_expiry(payload: dict) -> datetime:
+    return datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
+
 async def get_user_by_email(email: str):
     return await db.users.find_one({"email": email})
 
 async def authenticate_user(username_or_email: str, password: str):
-    user = await db.users.find_one({"username": username_or_email})
+    # One round trip; $or is answered from the two unique indexes
+    candidates = await db.users.find(
+        {"$or": [{"username": username_or_email}, {"email": username_or_email}]}
+    ).limit(2).to_list(2)
+    # A username match wins over someone else's email, as before
+    user = next((u for u in candidates if u["username"] == username_or_email), candidates[0] if candidates else None)
     if not user:
-        user = await db.users.find_one({"email": username_or_email})
-    if not user or not verify_password(password, user["password_hash"]):
         return None
+    valid, new_hash = await verify_password(password, user["password_hash"])
+    if not valid:
+        return None
+    if new_hash:
+        # Transparently upgrade hashes made with an older bcrypt cost
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
+        user["password_hash"] = new_hash
     return user
 
-@app.post("/api/v1/auth/register", response_model=Token)
+def token_user_id(authorization: Optional[str]) -> Optional[str]:
+    """user_id from a valid bearer token, without touching the database"""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("user_id")
+    except JWTError:
+        return None
+
+def rate_limit(route: str, limit: Limit):
+    """Dependency charging the caller's bucket for route: per user with a valid token, otherwise per IP"""
+    async def dependency(request: Request):
+        user_id = token_user_id(request.headers.get("authorization"))
+        key = f"{route}:user:{user_id}" if user_id else f"{route}:ip:{client_ip(request.scope)}"
+        retry_after = await rate_limiter.hit(key, limit)
+        if retry_after:
+            raise HTTPException(
+                status_code=429, detail="Too many requests", headers={"Retry-After": retry_after_header(retry_after)}
+            )
+    return dependency
+
+def request_actor(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """Dependency: the caller's user id for the activity feed, if a valid token was sent"""
+    return token_user_id(authorization)
+
+@app.post("/api/v1/auth/register", response_model=Token, dependencies=[Depends(rate_limit("register", RATE_LIMIT_REGISTER))])
 async def register(user: UserRegister):
     # Check if user exists
     if await db.users.find_one({"email": user.email}):
@@ -95,9 +406,10 @@ async def register(user: UserRegister):
     if await db.users.find_one({"username": user.username}):
         raise HTTPException(status_code=400, detail="Username already taken")
     
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password(user.password)
     user_doc = {
         "username": user.username,
+        "username_lower": user.username.lower(),
         "email": user.email,
         "password_hash": hashed_password,
         "created_at": datetime.now(timezone.utc),
@@ -112,7 +424,7 @@ async def register(user: UserRegister):
     
     return {"access_token": access_token, "refresh_token": refresh_token}
 
-@app.post("/api/v1/auth/login", response_model=Token)
+@app.post("/api/v1/auth/login", response_model=Token, dependencies=[Depends(rate_limit("login", RATE_LIMIT_LOGIN))])
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await authenticate_user(form_data.username, form_data.password)
     if not user:
@@ -126,40 +438,102 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     
     return {"access_token": access_token, "refresh_token": refresh_token}
 
-@app.post("/api/v1/auth/refresh", response_model=Token)
+@app.post("/api/v1/auth/refresh", response_model=Token, dependencies=[Depends(rate_limit("refresh", RATE_LIMIT_REFRESH))])
 async def refresh_token(refresh_token: str):
-    try:
-        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    payload = decode_token(refresh_token, "refresh")
+    user_id = payload["user_id"]
+    # Refresh tokens are single use: exchanging one revokes it, and a second exchange fails.
+    # Ones issued without a jti cannot be tracked, so they have to log in again.
+    if not payload.get("jti") or not await revoked_tokens.claim(payload["jti"], token_expiry(payload), user_id):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
     
     access_token = create_access_token({"user_id": user_id})
     refresh_token = create_refresh_token({"user_id": user_id})
     
     return {"access_token": access_token, "refresh_token": refresh_token}
 
+# Revokes the bearer access token and, if given, the refresh token; invalid tokens are ignored
 @app.post("/api/v1/auth/logout")
-async def logout():
-    # With JWT, logout is handled client-side or with token blacklist (optional)
+async def logout(refresh_token: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    tokens = []
+    if authorization and authorization.lower().startswith("bearer "):
+        tokens.append((authorization[7:], "access"))
+    if refresh_token:
+        tokens.append((refresh_token, "refresh"))
+    for token, token_type in tokens:
+        try:
+            payload = decode_token(token, token_type)
+        except HTTPException:
+            continue
+        if payload.get("jti"):
+            await revoked_tokens.revoke(payload["jti"], token_expiry(payload), payload["user_id"])
     return {"message": "Logged out successfully"}
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+# Authenticated user documents keyed by (user_id, token iat) so every
+# protected request does not cost a users lookup.
+user_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_cached_user(user_id):
+    """Drop every cached copy of a user, whichever token it was loaded for"""
+    user_cache.invalidate_tag(str(user_id))
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
+    payload = decode_token(token, "access")
+    user_id = payload["user_id"]
+    # In memory unless the revocation list has outgrown REVOCATION_EXACT_MAX_SIZE
+    if payload.get("jti") and await revoked_tokens.is_revoked(payload["jti"]):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+
+    cache_key = (user_id, payload.get("iat"))
+    user = user_cache.get(cache_key)
+    if user is MISSING:
         user = await db.users.find_one({"_id": ObjectId(user_id)})
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        user_cache.set(cache_key, user, tags=(user_id,))
+    return user
+
+async def require_admin(current_user: dict = Depends(get_current_user)) -> dict:
+    if str(current_user["_id"]) not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+@app.get("/api/v1/internal/cache", dependencies=[Depends(require_admin)])
+async def cache_stats():
+    return {
+        "users": user_cache.stats(),
+        "password_pool": password_hasher.stats(),
+        "notification_hub": notification_hub.stats(),
+        "notification_buffer": notification_buffer.stats(),
+        "unread_deltas": unread_deltas.stats(),
+        "task_search": task_search_cache.stats(),
+        "project_acl": project_acl_cache.stats(),
+        "revoked_tokens": revoked_tokens.stats(),
+        "deletion_jobs": deletion_jobs.stats(),
+        "activity_buffer": activity_buffer.stats(),
+        "activity_recent": activity_recent.stats(),
+    }
+
+@app.get("/api/v1/internal/health", dependencies=[Depends(require_admin)])
+async def health_details(response: Response):
+    """The health check with the ping error and connection pool usage"""
+    mongo = await ping_mongo()
+    if not mongo["ok"]:
+        response.status_code = 503
+    return {
+        "status": "ok" if mongo["ok"] else "unavailable",
+        "mongo": mongo,
+        "pool": {
+            "max_pool_size": init_db.MONGO_MAX_POOL_SIZE,
+            "wait_queue_timeout_ms": init_db.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "read_only_preference": init_db.MONGO_READ_ONLY_PREFERENCE,
+            "servers": pool_listener.stats(),
+        },
+        "admission": admission.stats(),
+        "rate_limiter": rate_limiter.stats(),
+    }
 
 # ---------------- CREATE ORG ----------------
 @app.post("/organizations")
@@ -177,6 +551,7 @@ async def create_organization(org: OrganizationCreate, current_user: dict = Depe
         {"_id": current_user["_id"]},
         {"$addToSet": {"organizations": result.inserted_id}}
     )
+    invalidate_cached_user(current_user["_id"])
 
     return {"message": "Organization created", "organization_id": str(result.inserted_id)}
 
@@ -197,6 +572,7 @@ async def join_organization(req: JoinOrganization, current_user: dict = Depends(
         {"_id": current_user["_id"]},
         {"$addToSet": {"organizations": org_id}}  # prevents duplicates
     )
+    invalidate_cached_user(current_user["_id"])
 
     return {"message": "User joined organization", "organization_id": req.organization_id}
 
@@ -213,6 +589,7 @@ class UserUpdate(BaseModel):
     username: Optional[str] = None
     email: Optional[EmailStr] = None
 
+@timed("serialize")
 def user_doc_to_out(doc: dict) -> UserOut:
     return UserOut(
         id=str(doc["_id"]),
@@ -222,6 +599,17 @@ def user_doc_to_out(doc: dict) -> UserOut:
         created_at=doc["created_at"]
     )
 
+@timed("serialize")
+def user_doc_to_dict(doc: dict) -> dict:
+    """UserOut-shaped dict for FastJSONResponse; ObjectIds and datetimes are left to the encoder"""
+    return {
+        "id": doc["_id"],
+        "username": doc["username"],
+        "email": doc["email"],
+        "is_active": doc.get("is_active", True),
+        "created_at": doc["created_at"],
+    }
+
 @app.get("/api/v1/users/me", response_model=UserOut)
 async def get_current_user_endpoint(current_user: dict = Depends(get_current_user)):
     return user_doc_to_out(current_user)
@@ -234,23 +622,47 @@ async def update_current_user_endpoint(
     update_data = {k: v for k, v in update.dict(exclude_unset=True).items()}
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
+    if update_data.get("username"):
+        update_data["username_lower"] = update_data["username"].lower()
 
     result = await db.users.find_one_and_update(
         {"_id": ObjectId(current_user["_id"])},
         {"$set": update_data},
-        return_document=True  # you may need ReturnDocument.AFTER
+        return_document=ReturnDocument.AFTER,
     )
     if not result:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_cached_user(current_user["_id"])
 
     return user_doc_to_out(result)
 
+USER_SEARCH_MAX_RESULTS = 25
+USER_SEARCH_PROJECTION = {"username": 1, "username_lower": 1, "email": 1, "is_active": 1, "created_at": 1}
+
+async def backfill_username_lower():
+    """Give users created before username_lower existed their search key (single pipeline update)"""
+    await db.users.update_many(
+        {"username_lower": {"$exists": False}},
+        [{"$set": {"username_lower": {"$toLower": "$username"}}}],
+    )
+
 # GET /api/v1/users/search
-@app.get("/api/v1/users/search", response_model=List[UserOut])
-async def search_users(q: str = Query(..., min_length=2)):
-    cursor = db.users.find({"username": {"$regex": q, "$options": "i"}}).limit(10)
-    users = [user_doc_to_out(doc) async for doc in cursor]
-    return users
+@app.get("/api/v1/users/search", response_model=List[UserOut], dependencies=[Depends(rate_limit("search_users", RATE_LIMIT_SEARCH))])
+async def search_users(
+    q: str = Query(..., min_length=2),
+    limit: int = Query(10, ge=1, le=USER_SEARCH_MAX_RESULTS),
+):
+    # Anchored, case-sensitive regex on the lowercased field is a range scan on idx_users_username_lower
+    prefix = q.strip().lower()
+    cursor = read_db.users.find(
+        {"username_lower": {"$regex": "^" + re.escape(prefix)}}, USER_SEARCH_PROJECTION
+    ).sort("username_lower", 1).limit(limit)
+    docs = await cursor.to_list(limit)
+    # Exact match first, then shorter (closer) prefix matches
+    docs.sort(key=lambda doc: (doc["username_lower"] != prefix, len(doc["username_lower"]), doc["username_lower"]))
+    if FAST_JSON:
+        return FastJSONResponse([user_doc_to_dict(doc) for doc in docs])
+    return [user_doc_to_out(doc) for doc in docs]
 
 # -----------------------------
 # Project Management 
@@ -269,33 +681,75 @@ class ProjectCreate(BaseModel):
     organization_id: str   # <-- required in your schema
 
 class ProjectUpdate(BaseModel):
-    name: Optional[str]
-    description: Optional[str]
-    priority: Optional[str]
-    status: Optional[str]
-    end_date: Optional[str]
+    name: Optional[str] = None
+    description: Optional[str] = None
+    priority: Optional[str] = None
+    status: Optional[str] = None
+    end_date: Optional[str] = None
     tags: Optional[List[str]] = []
 
+PROJECT_FIELDS = {
+    "name", "description", "organization_id", "owner_id", "status", "priority",
+    "members", "metadata", "progress", "created_at", "updated_at", "version",
+}
+
+@timed("serialize")
 def serialize_project(project: dict) -> dict:
     """Convert ObjectIds to strings for JSON response"""
     project["_id"] = str(project["_id"])
-    project["organization_id"] = str(project["organization_id"])
-    project["owner_id"] = str(project["owner_id"])
+    if "organization_id" in project:
+        project["organization_id"] = str(project["organization_id"])
+    if "owner_id" in project:
+        project["owner_id"] = str(project["owner_id"])
     for member in project.get("members", []):
         member["user_id"] = str(member["user_id"])
     return project
 
 
+def project_list_etag(request: Request, projects: List[dict]) -> str:
+    # Any write to a listed project bumps its version; joining or leaving one changes the ids
+    return make_etag("projects", str(request.query_params), [(p["_id"], p.get("version", 0)) for p in projects])
+
 @app.get("/api/v1/projects")
-async def list_projects(current_user: dict = Depends(get_current_user)):
+async def list_projects(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
     user_id = current_user["_id"]
-
-    projects = await db.projects.find({"members.user_id": user_id}).to_list(100)
-
-    # Convert ObjectIds → str for each project
-    projects = [serialize_project(p) for p in projects]
-
-    return projects
+    paged = not (limit is None and after is None and fields is None)
+    query = {"members.user_id": user_id, "deleting": {"$ne": True}}
+
+    if if_none_match:
+        if paged:
+            stubs, _ = await fetch_page(db.projects, query, limit or DEFAULT_PAGE_SIZE, after, {"version": 1})
+        else:
+            stubs = await db.projects.find(query, {"version": 1}).to_list(100)
+        etag = project_list_etag(request, stubs)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+    if not paged:
+        projects = await db.projects.find(query).to_list(100)
+        # serialize_project only stringifies ObjectIds, which FastJSONResponse does anyway
+        return cacheable_response(
+            projects, project_list_etag(request, projects), response,
+            # Convert ObjectIds → str for each project
+            lambda content: [serialize_project(p) for p in content],
+        )
+
+    projection = parse_fields(fields, PROJECT_FIELDS)
+    if projection:
+        projection["version"] = 1  # needed for the ETag
+    projects, next_cursor = await fetch_page(db.projects, query, limit or DEFAULT_PAGE_SIZE, after, projection)
+    return cacheable_response(
+        {"items": projects, "next_cursor": next_cursor}, project_list_etag(request, projects), response,
+        lambda content: {"items": [serialize_project(p) for p in content["items"]], "next_cursor": next_cursor},
+    )
 
 @app.post("/api/v1/projects")
 async def create_project(project: ProjectCreate, current_user: dict = Depends(get_current_user)):
@@ -333,12 +787,14 @@ async def create_project(project: ProjectCreate, current_user: dict = Depends(ge
                 "tasks_total": 0,
                 "tasks_completed": 0
             },
+            "version": 0,
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc)
         }
 
         result = await db.projects.insert_one(project_doc)
         project_doc["_id"] = result.inserted_id
+        record_activity(result.inserted_id, "project.created", current_user["_id"], name=project.name)
 
         # Convert ObjectId → string for Swagger/JSON response
         project_doc["_id"] = str(project_doc["_id"])
@@ -352,98 +808,277 @@ async def create_project(project: ProjectCreate, current_user: dict = Depends(ge
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating project: {str(e)}")
 
-@app.get("/api/v1/projects/{project_id}")
-async def get_project(project_id: str = Path(...), current_user: dict = Depends(get_current_user)):
-    project = await db.projects.find_one({"_id": ObjectId(project_id)})
-    if not project:
+# -----------------------------
+# Project access control
+# -----------------------------
+# (project_id, user_id) -> "owner", the member's role, "" for a non-member or
+# None for a missing project. Membership writes in this process invalidate
+# entries; other workers pick them up within the TTL.
+project_acl_cache = TTLCache(maxsize=PROJECT_ACL_CACHE_MAX_SIZE, ttl=PROJECT_ACL_CACHE_TTL_SECONDS)
+MANAGER_ROLES = ("owner", "manager")
+
+def invalidate_project_acl(project_id, user_id=None):
+    """Forget one user's role in a project, or every cached role for it"""
+    if user_id is None:
+        project_acl_cache.invalidate_tag(str(project_id))
+    else:
+        project_acl_cache.invalidate((str(project_id), str(user_id)))
+
+async def get_project_role(project_id: ObjectId, user_id: ObjectId) -> Optional[str]:
+    key = (str(project_id), str(user_id))
+    role = project_acl_cache.get(key)
+    if role is MISSING:
+        # $elemMatch returns only the caller's member entry, never the whole list
+        project = await db.projects.find_one(
+            {"_id": project_id, "deleting": {"$ne": True}},
+            {"owner_id": 1, "members": {"$elemMatch": {"user_id": user_id}}},
+        )
+        if project is None:
+            role = None
+        elif project.get("owner_id") == user_id:
+            role = "owner"
+        else:
+            role = project["members"][0]["role"] if project.get("members") else ""
+        project_acl_cache.set(key, role, tags=(key[0],))
+    return role
+
+async def member_project_ids(user_id: ObjectId) -> List[ObjectId]:
+    """Ids of the projects user_id is a member of"""
+    return [
+        p["_id"] async for p in db.projects.find({"members.user_id": user_id, "deleting": {"$ne": True}}, {"_id": 1})
+    ]
+
+async def check_project_role(project_id: ObjectId, user_id: ObjectId, roles: tuple = ()) -> str:
+    """The caller's role in the project, or 404/403 like the project routes"""
+    role = await get_project_role(project_id, user_id)
+    if role is None:
         raise HTTPException(status_code=404, detail="Project not found")
-
-    # Check if user is a member
-    if not any(str(member["user_id"]) == str(current_user["_id"]) for member in project["members"]):
+    if not role:
         raise HTTPException(status_code=403, detail="Access denied")
+    if roles and role not in roles:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return role
 
-    return serialize_project(project)
+def require_project_role(*roles: str):
+    """Dependency for routes with a project_id path parameter; returns the caller's role"""
+    async def dependency(project_id: str, current_user: dict = Depends(get_current_user)) -> str:
+        return await check_project_role(ObjectId(project_id), current_user["_id"], roles)
+    return dependency
 
+require_project_member = require_project_role()
+require_project_manager = require_project_role(*MANAGER_ROLES)
 
-@app.put("/api/v1/projects/{project_id}")
-async def update_project(project_id: str, project_update: ProjectUpdate, current_user: dict = Depends(get_current_user)):
+
+def project_etag(project: dict) -> str:
+    return make_etag("project", project["_id"], project.get("version", 0))
+
+@app.get("/api/v1/projects/{project_id}")
+async def get_project(
+    response: Response,
+    project_id: str = Path(...),
+    if_none_match: Optional[str] = Header(None),
+    role: str = Depends(require_project_member),
+):
+    if if_none_match:
+        current = await db.projects.find_one({"_id": ObjectId(project_id)}, {"version": 1})
+        if current and etag_matches(if_none_match, project_etag(current)):
+            return not_modified(project_etag(current))
     project = await db.projects.find_one({"_id": ObjectId(project_id)})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
+    return cacheable_response(project, project_etag(project), response, serialize_project)
+
+
+def manager_filter(project_id: ObjectId, user_id: ObjectId) -> dict:
+    """Matches the project only when user_id is its owner or one of its managers"""
+    return {
+        "_id": project_id,
+        "deleting": {"$ne": True},
+        "$or": [{"owner_id": user_id}, {"members": {"$elemMatch": {"user_id": user_id, "role": "manager"}}}],
+    }
 
-    # Only owner or manager can update
-    is_manager = any(str(member["user_id"]) == str(current_user["_id"]) and member["role"] == "manager" for member in project["members"])
-    if str(project["owner_id"]) != str(current_user["_id"]) and not is_manager:
+async def raise_project_write_error(project_id: ObjectId, current_user: dict, member_id: Optional[ObjectId] = None):
+    """Explain why a conditional project write matched nothing; only runs on the failure path"""
+    project = await db.projects.find_one(
+        {"_id": project_id}, {"owner_id": 1, "members.user_id": 1, "members.role": 1, "deleting": 1}
+    )
+    if not project or project.get("deleting"):
+        raise HTTPException(status_code=404, detail="Project not found")
+    user_id = current_user["_id"]
+    is_manager = any(m["user_id"] == user_id and m["role"] == "manager" for m in project.get("members", []))
+    if project["owner_id"] != user_id and not is_manager:
         raise HTTPException(status_code=403, detail="Not authorized")
+    if member_id is not None and any(m["user_id"] == member_id for m in project.get("members", [])):
+        raise HTTPException(status_code=400, detail="User already a member")
+    raise HTTPException(status_code=409, detail="Project changed, please retry")
 
+
+@app.put("/api/v1/projects/{project_id}")
+async def update_project(project_id: str, project_update: ProjectUpdate, current_user: dict = Depends(get_current_user)):
     update_data = {k: v for k, v in project_update.dict().items() if v is not None}
     if "end_date" in update_data:
         update_data["metadata.end_date"] = datetime.strptime(update_data.pop("end_date"), "%Y-%m-%d")
 
     update_data["updated_at"] = datetime.now(timezone.utc)
 
-    await db.projects.update_one({"_id": ObjectId(project_id)}, {"$set": update_data})
-    updated_project = await db.projects.find_one({"_id": ObjectId(project_id)})
+    # Only owner or manager can update; the check is part of the write
+    updated_project = await db.projects.find_one_and_update(
+        manager_filter(ObjectId(project_id), current_user["_id"]),
+        {"$set": update_data, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated_project:
+        await raise_project_write_error(ObjectId(project_id), current_user)
+    record_activity(
+        updated_project["_id"], "project.updated", current_user["_id"],
+        fields=sorted(field for field in update_data if field != "updated_at"),
+    )
     return serialize_project(updated_project)
 
 
-@app.delete("/api/v1/projects/{project_id}")
+# The project disappears from every read at once; a deletion job removes it and its
+# tasks, comments and notifications in the background. Poll GET /api/v1/deletion_jobs/{job_id}.
+@app.delete("/api/v1/projects/{project_id}", status_code=202)
 async def delete_project(project_id: str, current_user: dict = Depends(get_current_user)):
-    project = await db.projects.find_one({"_id": ObjectId(project_id)})
+    project_oid = ObjectId(project_id)
+    project = await db.projects.find_one({"_id": project_oid}, {"owner_id": 1, "deleting": 1})
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-
     # Only owner can delete
-    if str(project["owner_id"]) != str(current_user["_id"]):
+    if project["owner_id"] != current_user["_id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
+    job = await deletion_jobs.find_active("project", project_oid) if project.get("deleting") else None
+    if job is None:
+        # Job first: if we stop before hiding the project, the job hides it
+        job = await deletion_jobs.submit("project", [project_oid], requested_by=current_user["_id"])
+        await db.projects.update_one({"_id": project_oid}, {"$set": {"deleting": True}, "$inc": {"version": 1}})
+    invalidate_project_acl(project_id)
+    invalidate_task_search(project_oid)
+    return {"message": "Project deleted successfully", "job_id": job["_id"]}
 
-    await db.projects.delete_one({"_id": ObjectId(project_id)})
-    return {"message": "Project deleted successfully"}
+
+@app.post("/api/v1/projects/{project_id}/progress/rebuild")
+async def rebuild_progress(project_id: str, role: str = Depends(require_project_manager)):
+    await rebuild_project_progress([ObjectId(project_id)])
+    updated_project = await db.projects.find_one({"_id": ObjectId(project_id)}, {"progress": 1})
+    return updated_project["progress"]
 
 
 @app.post("/api/v1/projects/{project_id}/members")
 async def add_member(project_id: str, member: ProjectMember, current_user: dict = Depends(get_current_user)):
-    project = await db.projects.find_one({"_id": ObjectId(project_id)})
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Only owner or manager can add
-    is_manager = any(str(m["user_id"]) == str(current_user["_id"]) and m["role"] == "manager" for m in project["members"])
-    if str(project["owner_id"]) != str(current_user["_id"]) and not is_manager:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    # Check if member already exists
-    if any(str(m["user_id"]) == member.user_id for m in project["members"]):
-        raise HTTPException(status_code=400, detail="User already a member")
-
+    member_id = ObjectId(member.user_id)
     project_member = {
-        "user_id": ObjectId(member.user_id),
+        "user_id": member_id,
         "role": member.role,
         "added_at": datetime.now(timezone.utc)
     }
-    await db.projects.update_one({"_id": ObjectId(project_id)}, {"$push": {"members": project_member}})
-    updated_project = await db.projects.find_one({"_id": ObjectId(project_id)})
+    # Only owner or manager can add, and only users who are not members yet
+    query = manager_filter(ObjectId(project_id), current_user["_id"])
+    query["members.user_id"] = {"$ne": member_id}
+    updated_project = await db.projects.find_one_and_update(
+        query, {"$push": {"members": project_member}, "$inc": {"version": 1}}, return_document=ReturnDocument.AFTER
+    )
+    if not updated_project:
+        await raise_project_write_error(ObjectId(project_id), current_user, member_id=member_id)
+    invalidate_project_acl(project_id, member_id)
+    invalidate_user_task_search(member.user_id)
+    record_activity(updated_project["_id"], "member.added", current_user["_id"], member_id, role=member.role)
     return serialize_project(updated_project)
 
 
 @app.delete("/api/v1/projects/{project_id}/members/{user_id}")
 async def remove_member(project_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    project = await db.projects.find_one({"_id": ObjectId(project_id)})
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     # Only owner or manager can remove
-    is_manager = any(str(m["user_id"]) == str(current_user["_id"]) and m["role"] == "manager" for m in project["members"])
-    if str(project["owner_id"]) != str(current_user["_id"]) and not is_manager:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    await db.projects.update_one(
-        {"_id": ObjectId(project_id)},
-        {"$pull": {"members": {"user_id": ObjectId(user_id)}}}
+    updated_project = await db.projects.find_one_and_update(
+        manager_filter(ObjectId(project_id), current_user["_id"]),
+        {"$pull": {"members": {"user_id": ObjectId(user_id)}}, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER,
     )
-    updated_project = await db.projects.find_one({"_id": ObjectId(project_id)})
+    if not updated_project:
+        await raise_project_write_error(ObjectId(project_id), current_user)
+    invalidate_project_acl(project_id, user_id)
+    invalidate_user_task_search(user_id)
+    record_activity(updated_project["_id"], "member.removed", current_user["_id"], ObjectId(user_id))
     return serialize_project(updated_project)
 
+# -----------------------------
+# Project progress counters
+# -----------------------------
+COMPLETED_STATUS = "completed"
+
+def _completion_percentage(total, completed):
+    return {"$cond": [{"$gt": [total, 0]}, {"$round": [{"$multiply": [{"$divide": [completed, total]}, 100]}, 1]}, 0]}
+
+async def advance_project(project_id: ObjectId, total: int = 0, completed: int = 0) -> Optional[int]:
+    """Take the project's next change version, shifting its task counters in the same update.
+
+    Every write to a project's tasks or comments goes through here and stamps
+    the returned version on what it wrote. A pipeline update is used instead
+    of $inc so the completion percentage is recomputed in the same operation.
+    """
+    stages = [{"$set": {"version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}}}]
+    if total or completed:
+        stages += [
+            {"$set": {
+                "progress.tasks_total": {"$add": [{"$ifNull": ["$progress.tasks_total", 0]}, total]},
+                "progress.tasks_completed": {"$add": [{"$ifNull": ["$progress.tasks_completed", 0]}, completed]},
+            }},
+            {"$set": {
+                "progress.completion_percentage": _completion_percentage("$progress.tasks_total", "$progress.tasks_completed"),
+            }},
+        ]
+    project = await db.projects.find_one_and_update(
+        {"_id": project_id}, stages, projection={"version": 1}, return_document=ReturnDocument.AFTER
+    )
+    return project["version"] if project else None
+
+async def record_deletions(project_id: ObjectId, kind: str, entity_ids: List[ObjectId], version: Optional[int]):
+    """Leave tombstones so /changes can report deletes"""
+    if not entity_ids or version is None:
+        return
+    now = datetime.now(timezone.utc)
+    await db.tombstones.insert_many([
+        {"project_id": project_id, "kind": kind, "entity_id": entity_id, "version": version, "deleted_at": now}
+        for entity_id in entity_ids
+    ], ordered=False)
+
+async def stamp_version(collection, doc_id: ObjectId, project_id: ObjectId, **progress) -> Optional[int]:
+    """Advance the project and mark doc_id as changed at the new version"""
+    version = await advance_project(project_id, **progress)
+    if version is not None:
+        await collection.update_one({"_id": doc_id}, {"$max": {"version": version}})
+    return version
+
+async def rebuild_project_progress(project_ids: Optional[List[ObjectId]] = None) -> int:
+    """Recompute progress for the given projects (or all) from one aggregation over tasks"""
+    pipeline = [{"$group": {
+        "_id": "$project_id",
+        "total": {"$sum": 1},
+        "completed": {"$sum": {"$cond": [{"$eq": ["$status", COMPLETED_STATUS]}, 1, 0]}},
+    }}]
+    project_filter = {}
+    if project_ids is not None:
+        pipeline.insert(0, {"$match": {"project_id": {"$in": project_ids}}})
+        project_filter = {"_id": {"$in": project_ids}}
+    counts = {row["_id"]: row async for row in db.tasks.aggregate(pipeline)}
+
+    updated = 0
+    ops = []
+    async for project in db.projects.find(project_filter, {"_id": 1}):
+        row = counts.get(project["_id"], {"total": 0, "completed": 0})
+        percentage = round(row["completed"] / row["total"] * 100, 1) if row["total"] else 0
+        ops.append(UpdateOne({"_id": project["_id"]}, {"$set": {"progress": {
+            "completion_percentage": percentage,
+            "tasks_total": row["total"],
+            "tasks_completed": row["completed"],
+        }}, "$inc": {"version": 1}}))
+        if len(ops) >= 1000:
+            updated += (await db.projects.bulk_write(ops, ordered=False)).matched_count
+            ops = []
+    if ops:
+        updated += (await db.projects.bulk_write(ops, ordered=False)).matched_count
+    return updated
+
 # -----------------------------
 # Task Management
 # -----------------------------
@@ -456,6 +1091,12 @@ class TaskUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     status: Optional[str] = None
+class TaskBatchOperation(BaseModel):
+    op: Literal["create", "update", "assign", "delete"]
+    task_id: Optional[str] = None  # required for everything but create
+    data: dict = {}                # TaskCreate / TaskUpdate fields, or {"assignee_id": ...}
+class TaskBatchRequest(BaseModel):
+    operations: List[TaskBatchOperation] = Field(..., max_length=500)
 class TaskOut(BaseModel):
     id: str
     title: str
@@ -465,7 +1106,15 @@ class TaskOut(BaseModel):
     creator_id: str
     assignee_id: Optional[str] = None
     created_at: datetime
+    comment_count: int = 0
+    last_comment_at: Optional[datetime] = None
+
+TASK_FIELDS = {
+    "title", "description", "status", "project_id", "creator_id", "assignee_id", "created_at", "version",
+    "comment_count", "last_comment_at",
+}
 
+@timed("serialize")
 def task_doc_to_out(doc: dict) -> TaskOut:
     return TaskOut(
         id=str(doc["_id"]),
@@ -476,18 +1125,95 @@ def task_doc_to_out(doc: dict) -> TaskOut:
         creator_id=str(doc["creator_id"]),
         assignee_id=str(doc["assignee_id"]) if doc.get("assignee_id") else None,
         created_at=doc["created_at"],
+        comment_count=doc.get("comment_count", 0),
+        last_comment_at=doc.get("last_comment_at"),
     )
 
+@timed("serialize")
+def task_doc_to_dict(doc: dict) -> dict:
+    """TaskOut-shaped dict for FastJSONResponse; ObjectIds and datetimes are left to the encoder"""
+    return {
+        "id": doc["_id"],
+        "title": doc["title"],
+        "description": doc.get("description"),
+        "status": doc.get("status", "pending"),
+        "project_id": doc["project_id"],
+        "creator_id": doc["creator_id"],
+        "assignee_id": doc.get("assignee_id") or None,
+        "created_at": doc["created_at"],
+        "comment_count": doc.get("comment_count", 0),
+        "last_comment_at": doc.get("last_comment_at"),
+    }
+
+@timed("serialize")
+def serialize_doc_fields(doc: dict) -> dict:
+    """Out-model shaped dict (id instead of _id, ObjectIds as str) for a raw or projected document"""
+    out = {"id": str(doc.pop("_id"))}
+    for key, value in doc.items():
+        out[key] = str(value) if isinstance(value, ObjectId) else value
+    return out
+
 # GET /api/v1/projects/{project_id}/tasks
-@app.get("/api/v1/projects/{project_id}/tasks", response_model=List[TaskOut])
-async def list_project_tasks(project_id: str):
-    cursor = db.tasks.find({"project_id": ObjectId(project_id)})
-    tasks = [task_doc_to_out(doc) async for doc in cursor]
-    return tasks
+# Returns List[TaskOut]; with limit/after/fields it returns {"items", "next_cursor"}
+@app.get("/api/v1/projects/{project_id}/tasks")
+async def list_project_tasks(
+    request: Request,
+    response: Response,
+    project_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    role: str = Depends(require_project_member),
+):
+    # Every task write advances the project version, so it stands in for the whole list.
+    # Read before the tasks: a write in between makes the tag stale, never the body.
+    project = await db.projects.find_one({"_id": ObjectId(project_id)}, {"version": 1})
+    etag = make_etag("tasks", project_id, project.get("version", 0) if project else 0, str(request.query_params))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    headers = {"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+
+    if limit is None and after is None and fields is None:
+        cursor = db.tasks.find({"project_id": ObjectId(project_id)})
+        if FAST_JSON:
+            return FastJSONResponse([task_doc_to_dict(doc) async for doc in cursor], headers=headers)
+        tasks = [task_doc_to_out(doc) async for doc in cursor]
+        response.headers.update(headers)
+        return tasks
+
+    projection = parse_fields(fields, TASK_FIELDS)
+    tasks, next_cursor = await fetch_page(
+        db.tasks, {"project_id": ObjectId(project_id)}, limit or DEFAULT_PAGE_SIZE, after, projection
+    )
+    if FAST_JSON:
+        if projection:
+            items = [{"id": doc.pop("_id"), **doc} for doc in tasks]
+        else:
+            items = [task_doc_to_dict(doc) for doc in tasks]
+        return FastJSONResponse({"items": items, "next_cursor": next_cursor}, headers=headers)
+    items = [serialize_doc_fields(doc) for doc in tasks] if projection else [task_doc_to_out(doc) for doc in tasks]
+    response.headers.update(headers)
+    return {"items": items, "next_cursor": next_cursor}
+
+# GET /api/v1/projects/{project_id}/tasks/export - NDJSON, resumable with ?after=<last id>
+@app.get("/api/v1/projects/{project_id}/tasks/export")
+async def export_project_tasks(
+    project_id: str,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    after: Optional[str] = None,
+    role: str = Depends(require_project_member),
+):
+    return ndjson_response(read_db.tasks, {"project_id": ObjectId(project_id)}, serialize_doc_fields, batch_size, after)
 
 # POST /api/v1/projects/{project_id}/tasks
 @app.post("/api/v1/projects/{project_id}/tasks", response_model=TaskOut)
-async def create_task(project_id: str, task: TaskCreate):
+async def create_task(
+    project_id: str,
+    task: TaskCreate,
+    role: str = Depends(require_project_member),
+    actor: Optional[str] = Depends(request_actor),
+):
     task_doc = {
         "title": task.title,
         "description": task.description,
@@ -496,9 +1222,16 @@ async def create_task(project_id: str, task: TaskCreate):
         "creator_id": ObjectId(task.creator_id),
         "assignee_id": None,
         "created_at": datetime.now(timezone.utc),
+        "comment_count": 0,  # last_comment_at is set by the first comment
     }
+    # Take the version first so the task is stamped as it is inserted
+    task_doc["version"] = await advance_project(
+        task_doc["project_id"], total=1, completed=int(task.status == COMPLETED_STATUS)
+    )
     result = await db.tasks.insert_one(task_doc)
     task_doc["_id"] = result.inserted_id
+    invalidate_task_search(task_doc["project_id"])
+    record_activity(task_doc["project_id"], "task.created", actor, task_doc["_id"], title=task.title, status=task.status)
     return task_doc_to_out(task_doc)
 
 # GET /api/v1/tasks/{task_id}
@@ -511,27 +1244,50 @@ async def get_task(task_id: str):
 
 # PUT /api/v1/tasks/{task_id}
 @app.put("/api/v1/tasks/{task_id}", response_model=TaskOut)
-async def update_task(task_id: str, update: TaskUpdate):
+async def update_task(task_id: str, update: TaskUpdate, actor: Optional[str] = Depends(request_actor)):
     update_data = {k: v for k, v in update.dict(exclude_unset=True).items()}
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
-    from pymongo import ReturnDocument
-    task = await db.tasks.find_one_and_update(
+    previous = await db.tasks.find_one_and_update(
         {"_id": ObjectId(task_id)},
         {"$set": update_data},
-        return_document=ReturnDocument.AFTER,
+        return_document=ReturnDocument.BEFORE,
     )
-    if not task:
+    if not previous:
         raise HTTPException(status_code=404, detail="Task not found")
+    task = {**previous, **update_data}
+    was_completed = previous.get("status") == COMPLETED_STATUS
+    is_completed = task.get("status") == COMPLETED_STATUS
+    task["version"] = await stamp_version(
+        db.tasks, previous["_id"], task["project_id"], completed=int(is_completed) - int(was_completed)
+    )
+    invalidate_task_search(task["project_id"])
+    record_activity(task["project_id"], "task.updated", actor, task["_id"], **task_changes(previous, update_data))
     return task_doc_to_out(task)
 
+def task_changes(previous: dict, update_data: dict) -> dict:
+    """Compact description of a task update: the fields set, plus the status transition"""
+    changes = {"fields": sorted(update_data)}
+    if "status" in update_data and update_data["status"] != previous.get("status"):
+        changes["status"] = [previous.get("status"), update_data["status"]]
+    return changes
+
 # DELETE /api/v1/tasks/{task_id}
 @app.delete("/api/v1/tasks/{task_id}")
-async def delete_task(task_id: str):
-    result = await db.tasks.delete_one({"_id": ObjectId(task_id)})
-    if result.deleted_count == 0:
+async def delete_task(task_id: str, actor: Optional[str] = Depends(request_actor)):
+    task = await db.tasks.find_one_and_delete(
+        {"_id": ObjectId(task_id)}, projection={"project_id": 1, "status": 1, "title": 1}
+    )
+    if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    return {"message": "Task deleted successfully"}
+    version = await advance_project(
+        task["project_id"], total=-1, completed=-int(task.get("status") == COMPLETED_STATUS)
+    )
+    await record_deletions(task["project_id"], "task", [task["_id"]], version)
+    invalidate_task_search(task["project_id"])
+    record_activity(task["project_id"], "task.deleted", actor, task["_id"], title=task.get("title"))
+    job = await deletion_jobs.submit("tasks", [task["_id"]])  # its comments and notifications
+    return {"message": "Task deleted successfully", "job_id": job["_id"]}
 
 @app.post("/api/v1/tasks/{task_id}/assign", response_model=TaskOut)
 async def assign_task(
@@ -539,6 +1295,8 @@ async def assign_task(
     assignee_id: str = Body(..., embed=True),
     current_user: dict = Depends(get_current_user)
 ):
+    if not ObjectId.is_valid(assignee_id):
+        raise HTTPException(status_code=400, detail="Invalid assignee_id")
     # Update task assignee
     task = await db.tasks.find_one_and_update(
         {"_id": ObjectId(task_id)},
@@ -547,12 +1305,387 @@ async def assign_task(
     )
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    task["version"] = await stamp_version(db.tasks, task["_id"], task["project_id"])
+    invalidate_task_search(task["project_id"])
+    record_activity(task["project_id"], "task.assigned", current_user["_id"], task["_id"], assignee_id=assignee_id)
 
     # Add mock notification
     message = f"You have been assigned to task: {task['title']}"
-    await add_notification(message=message, user_id=assignee_id)
+    add_notification(message=message, user_id=assignee_id, task_id=task["_id"], type="task_assigned")
 
     return task_doc_to_out(task)
+
+async def bulk_write_results(collection, entries: list) -> int:
+    """Run (result, operation) pairs as one unordered bulk write, failing the results whose operations
+    errored; returns how many documents the write matched"""
+    if not entries:
+        return 0
+    try:
+        outcome = await collection.bulk_write([operation for _, operation in entries], ordered=False)
+        return outcome.matched_count
+    except BulkWriteError as exc:
+        for error in exc.details.get("writeErrors", []):
+            entries[error["index"]][0].update(ok=False, status_code=500, error=error.get("errmsg", "Write failed"))
+        return exc.details.get("nMatched", 0)
+    except Exception:
+        for result, _ in entries:
+            result.update(ok=False, status_code=500, error="Write failed")
+        return 0
+
+# POST /api/v1/projects/{project_id}/tasks:batch - many board actions in one request
+@app.post("/api/v1/projects/{project_id}/tasks:batch")
+async def batch_tasks(
+    project_id: str,
+    batch: TaskBatchRequest,
+    role: str = Depends(require_project_member),
+    actor: Optional[str] = Depends(request_actor),
+):
+    project_oid = ObjectId(project_id)
+    results = [{"index": i, "op": op.op, "task_id": op.task_id, "ok": False} for i, op in enumerate(batch.operations)]
+
+    # One read to 404 unknown tasks up front and for the titles assign notifications use
+    referenced = set()
+    for result, op in zip(results, batch.operations):
+        if op.op == "create":
+            continue
+        if not op.task_id or not ObjectId.is_valid(op.task_id):
+            result.update(status_code=400, error="Invalid task_id")
+            continue
+        if ObjectId(op.task_id) in referenced:
+            # Operations on one task would race each other across the concurrent writes below
+            raise HTTPException(status_code=422, detail=f"Task {op.task_id} appears more than once in the batch")
+        referenced.add(ObjectId(op.task_id))
+    existing = {}
+    if referenced:
+        async for task in db.tasks.find({"_id": {"$in": list(referenced)}, "project_id": project_oid}, {"status": 1, "title": 1}):
+            existing[task["_id"]] = task
+
+    now = datetime.now(timezone.utc)
+    # The whole batch shares one version, taken before the writes so they can carry it
+    version = await advance_project(project_oid)
+    # bulk_write only reports totals, so status moves are split by whether they enter or leave the
+    # completed status: the matched counts of those two writes are the completion change, taken at
+    # write time. Moves between other statuses go last; their filter skips tasks that meanwhile
+    # became completed. Deletes return the task they removed.
+    writes, completing, reopening, moving, deletes, effects = [], [], [], [], [], []
+    for result, op in zip(results, batch.operations):
+        if "error" in result:
+            continue
+        try:
+            if op.op == "create":
+                task = TaskCreate(**op.data)
+                doc = {
+                    "_id": ObjectId(),
+                    "title": task.title,
+                    "description": task.description,
+                    "status": task.status,
+                    "project_id": project_oid,
+                    "creator_id": ObjectId(task.creator_id),
+                    "assignee_id": None,
+                    "created_at": now,
+                    "comment_count": 0,
+                    "version": version,
+                }
+                writes.append((result, InsertOne(doc)))
+                result["task_id"] = str(doc["_id"])
+                result["task"] = doc
+                effects.append((result, doc["_id"], None, doc["status"]))
+            else:
+                task_id = ObjectId(op.task_id)
+                if task_id not in existing:
+                    result.update(status_code=404, error="Task not found")
+                    continue
+                query = {"_id": task_id, "project_id": project_oid}
+                if op.op == "update":
+                    update_data = TaskUpdate(**op.data).dict(exclude_unset=True)
+                    if not update_data:
+                        result.update(status_code=400, error="No fields to update")
+                        continue
+                    status = update_data.get("status")
+                    fields = {k: v for k, v in update_data.items() if k != "status" or status is None}
+                    if fields:
+                        writes.append((result, UpdateOne(query, {"$set": fields, "$max": {"version": version}})))
+                    if status is not None:
+                        update = {"$set": {"status": status}, "$max": {"version": version}}
+                        if status == COMPLETED_STATUS:
+                            completing.append((result, UpdateOne({**query, "status": {"$ne": status}}, update)))
+                        else:
+                            reopening.append((result, UpdateOne({**query, "status": COMPLETED_STATUS}, update)))
+                            moving.append((result, UpdateOne({**query, "status": {"$nin": [COMPLETED_STATUS, status]}}, update)))
+                    effects.append((result, task_id, "update", update_data))
+                elif op.op == "assign":
+                    assignee_id = op.data.get("assignee_id")
+                    if not assignee_id or not ObjectId.is_valid(assignee_id):
+                        result.update(status_code=400, error="Invalid assignee_id")
+                        continue
+                    writes.append((result, UpdateOne(
+                        query, {"$set": {"assignee_id": assignee_id}, "$max": {"version": version}}  # store as string
+                    )))
+                    effects.append((result, task_id, "assign", assignee_id))
+                else:
+                    deletes.append((result, db.tasks.find_one_and_delete(query, projection={"status": 1, "title": 1})))
+                    effects.append((result, task_id, "delete", None))
+        except Exception as exc:
+            result.update(status_code=400, error=str(exc))
+            continue
+        result.update(ok=True, status_code=200)
+
+    _, completed, reopened, *deleted_docs = await asyncio.gather(
+        bulk_write_results(db.tasks, writes),
+        bulk_write_results(db.tasks, completing),
+        bulk_write_results(db.tasks, reopening),
+        *(delete for _, delete in deletes),
+        return_exceptions=True,
+    )
+    await bulk_write_results(db.tasks, moving)
+    found = {}  # task_id -> the task as its delete found it
+    for (result, _), outcome in zip(deletes, deleted_docs):
+        if isinstance(outcome, Exception):
+            result.update(ok=False, status_code=500, error="Write failed")
+        elif outcome is None:
+            result.update(ok=False, status_code=404, error="Task not found")
+        else:
+            found[outcome["_id"]] = outcome
+
+    # Net progress change: creates count their own status, deletes the status they removed
+    total_delta, completed_delta = 0, completed - reopened
+    deleted = []
+    for result, task_id, kind, value in effects:
+        if not result["ok"]:
+            continue
+        if kind is None:  # create
+            total_delta += 1
+            completed_delta += int(value == COMPLETED_STATUS)
+            record_activity(project_oid, "task.created", actor, task_id, title=result["task"]["title"], status=value)
+            result["task"] = task_doc_to_out(result["task"])
+        elif kind == "update":
+            record_activity(project_oid, "task.updated", actor, task_id, **task_changes(existing[task_id], value))
+        elif kind == "assign":
+            message = f"You have been assigned to task: {existing[task_id]['title']}"
+            add_notification(message=message, user_id=value, task_id=task_id, type="task_assigned")
+            record_activity(project_oid, "task.assigned", actor, task_id, assignee_id=value)
+        elif kind == "delete":
+            record_activity(project_oid, "task.deleted", actor, task_id, title=found[task_id].get("title"))
+            deleted.append(task_id)
+            total_delta -= 1
+            completed_delta -= int(found[task_id].get("status") == COMPLETED_STATUS)
+    for result in results:
+        if not result["ok"]:
+            result.pop("task", None)
+
+    await record_deletions(project_oid, "task", deleted, version)
+    if deleted:
+        await deletion_jobs.submit("tasks", deleted)
+    if total_delta or completed_delta:
+        await advance_project(project_oid, total=total_delta, completed=completed_delta)
+    invalidate_task_search(project_oid)
+    return {"results": results, "succeeded": sum(r["ok"] for r in results), "failed": sum(not r["ok"] for r in results)}
+
+# -----------------------------
+# Delta sync
+# -----------------------------
+# GET /api/v1/projects/{project_id}/changes?since=<version>
+# Tasks and comments written after `since`, plus tombstones for deletes. Clients
+# start from the list endpoints and the project's version, then poll here with
+# the version they were last given; a few versions before
+# `since` are re-sent (CHANGES_OVERLAP_VERSIONS), so apply entries by id and keep
+# the higher version. With truncated=true, call again with since=<version>.
+@app.get("/api/v1/projects/{project_id}/changes")
+async def project_changes(
+    project_id: str,
+    since: int = Query(0, ge=0),
+    role: str = Depends(require_project_member),
+):
+    project_oid = ObjectId(project_id)
+    project = await db.projects.find_one({"_id": project_oid}, {"version": 1})
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    version = project.get("version", 0)
+    sources = (
+        (db.tasks, None),
+        (db.comments, None),
+        (db.tombstones, {"_id": 0, "kind": 1, "entity_id": 1, "version": 1}),
+    )
+
+    def changed(collection, projection, low, high, limit=0):
+        query = {"project_id": project_oid, "version": {"$gt": low, "$lte": high}}
+        return collection.find(query, projection).sort("version", 1).limit(limit).to_list(None)
+
+    # Only rows past `since` count towards the cap; the overlap window is re-read separately
+    fresh = await asyncio.gather(*(
+        changed(collection, projection, since, version, CHANGES_MAX_RESULTS + 1) for collection, projection in sources
+    ))
+    truncated = any(len(rows) > CHANGES_MAX_RESULTS for rows in fresh)
+    if truncated:
+        # Stop below the first version that did not fit, so no version is reported half-applied,
+        # but always take at least the first new version so the next call moves past `since`
+        version = min(
+            max(rows[CHANGES_MAX_RESULTS]["version"] - 1, rows[0]["version"])
+            for rows in fresh if len(rows) > CHANGES_MAX_RESULTS
+        )
+
+        async def up_to_cut(rows, collection, projection):
+            if len(rows) > CHANGES_MAX_RESULTS and rows[CHANGES_MAX_RESULTS]["version"] <= version:
+                # A single version larger than the cap: fetch all of it
+                return await changed(collection, projection, since, version)
+            return [row for row in rows if row["version"] <= version]
+
+        fresh = await asyncio.gather(*(
+            up_to_cut(rows, collection, projection) for rows, (collection, projection) in zip(fresh, sources)
+        ))
+    overlap = [[], [], []]
+    if since:
+        overlap = await asyncio.gather(*(
+            changed(collection, projection, max(0, since - CHANGES_OVERLAP_VERSIONS), since)
+            for collection, projection in sources
+        ))
+    tasks, comments, deleted = (old + new for old, new in zip(overlap, fresh))
+    if since == 0:
+        deleted = []  # a full sync has nothing to delete
+
+    content = {
+        "version": version,
+        "truncated": bool(truncated),
+        "tasks": [serialize_doc_fields(doc) for doc in tasks],
+        "comments": [serialize_doc_fields(doc) for doc in comments],
+        "deleted": [{"kind": row["kind"], "id": str(row["entity_id"]), "version": row["version"]} for row in deleted],
+    }
+    return FastJSONResponse(content) if FAST_JSON else content
+
+# -----------------------------
+# Activity feed
+# -----------------------------
+# Every project mutation queues a compact event: written in batches by activity_buffer
+# (expiring after ACTIVITY_TTL_DAYS, see indexes.py) and kept in activity_recent, so
+# the first pages of a busy project's feed are served from memory.
+def record_activity(project_id: ObjectId, type: str, actor_id=None, entity_id: Optional[ObjectId] = None, **data):
+    """Queue an event for the project's feed; callers never wait on Mongo"""
+    event = {
+        "_id": ObjectId(),
+        "project_id": project_id,
+        "type": type,
+        "actor_id": ObjectId(actor_id) if actor_id else None,
+        "entity_id": entity_id,
+        "data": data,
+        "created_at": datetime.now(timezone.utc),
+    }
+    activity_buffer.add(event)
+    activity_recent.push(project_id, event)
+
+@timed("serialize")
+def activity_doc_to_dict(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "type": doc["type"],
+        "actor_id": str(doc["actor_id"]) if doc.get("actor_id") else None,
+        "entity_id": str(doc["entity_id"]) if doc.get("entity_id") else None,
+        "data": doc.get("data", {}),
+        "created_at": doc["created_at"],
+    }
+
+def recent_activity_page(project_id: ObjectId, limit: int, after: Optional[str]):
+    """(events, next_cursor) from activity_recent, or None when it cannot answer on its own"""
+    cached = activity_recent.get(project_id)
+    if cached is MISSING:
+        return None
+    events, complete = cached
+    start = 0
+    if after:
+        last_id = decode_cursor(after)
+        while start < len(events) and events[start]["_id"] >= last_id:
+            start += 1
+    window = events[start:start + limit + 1]
+    if len(window) > limit:
+        return window[:limit], encode_cursor(window[limit - 1]["_id"])
+    if complete:
+        return window, None
+    return None
+
+# GET /api/v1/projects/{project_id}/activity?limit=&after= - newest first
+@app.get("/api/v1/projects/{project_id}/activity")
+async def project_activity(
+    project_id: str,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    role: str = Depends(require_project_member),
+):
+    project_oid = ObjectId(project_id)
+    page = recent_activity_page(project_oid, limit, after)
+    if page is None and after is None and limit < ACTIVITY_RECENT_SIZE and ACTIVITY_RECENT_PROJECTS > 0:
+        # Load the newest events once; the following reads of this project come from memory
+        newest = await db.activity.find({"project_id": project_oid}).sort("_id", -1).limit(ACTIVITY_RECENT_SIZE).to_list(None)
+        activity_recent.fill(project_oid, newest, complete=len(newest) < ACTIVITY_RECENT_SIZE)
+        page = recent_activity_page(project_oid, limit, after)
+    if page is None:
+        page = await fetch_page(db.activity, {"project_id": project_oid}, limit, after, newest_first=True)
+    events, next_cursor = page
+    return {"items": [activity_doc_to_dict(event) for event in events], "next_cursor": next_cursor}
+
+# -----------------------------
+# Task Search
+# -----------------------------
+# Recent search results, tagged with every project they cover and with the
+# searching user so a write to any of those projects (or a membership change)
+# drops them.
+task_search_cache = TTLCache(maxsize=TASK_SEARCH_CACHE_SIZE, ttl=TASK_SEARCH_CACHE_TTL_SECONDS)
+
+def invalidate_task_search(project_id):
+    task_search_cache.invalidate_tag(("project", str(project_id)))
+
+def invalidate_user_task_search(user_id):
+    task_search_cache.invalidate_tag(("user", str(user_id)))
+
+def encode_search_cursor(score: float, last_id: ObjectId) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, str(last_id)]).encode()).decode().rstrip("=")
+
+def decode_search_cursor(token: str):
+    try:
+        score, last_id = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return float(score), ObjectId(last_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# GET /api/v1/search/tasks?q= - full-text search over the projects the user belongs to
+@app.get("/api/v1/search/tasks", dependencies=[Depends(rate_limit("search_tasks", RATE_LIMIT_SEARCH))])
+async def search_tasks(
+    q: str = Query(..., min_length=1),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    assignee_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    user_key = str(current_user["_id"])
+    cache_key = (user_key, q, status_filter, assignee_id, limit, after)
+    cached = task_search_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+
+    project_ids = await member_project_ids(current_user["_id"])
+    match = {"$text": {"$search": q}, "project_id": {"$in": project_ids}}
+    if status_filter:
+        match["status"] = status_filter
+    if assignee_id:
+        # assign_task stores the assignee as a string
+        match["assignee_id"] = {"$in": [assignee_id, ObjectId(assignee_id)]} if ObjectId.is_valid(assignee_id) else assignee_id
+
+    pipeline = [{"$match": match}, {"$addFields": {"score": {"$meta": "textScore"}}}]
+    if after:
+        score, last_id = decode_search_cursor(after)
+        pipeline.append({"$match": {"$or": [{"score": {"$lt": score}}, {"score": score, "_id": {"$gt": last_id}}]}})
+    pipeline += [{"$sort": {"score": -1, "_id": 1}}, {"$limit": limit + 1}]
+    docs = await db.tasks.aggregate(pipeline).to_list(limit + 1)
+
+    next_cursor = encode_search_cursor(docs[limit - 1]["score"], docs[limit - 1]["_id"]) if len(docs) > limit else None
+    result = {
+        "items": [{**task_doc_to_out(doc).dict(), "score": doc["score"]} for doc in docs[:limit]],
+        "next_cursor": next_cursor,
+    }
+    task_search_cache.set(
+        cache_key, result, tags=[("user", user_key)] + [("project", str(pid)) for pid in project_ids]
+    )
+    return result
+
 # -----------------------------
 # Communication
 # -----------------------------
@@ -568,6 +1701,7 @@ class CommentOut(BaseModel):
     content: str
     created_at: datetime
 
+@timed("serialize")
 def comment_doc_to_out(doc: dict) -> CommentOut:
     return CommentOut(
         id=str(doc["_id"]),
@@ -577,12 +1711,78 @@ def comment_doc_to_out(doc: dict) -> CommentOut:
         created_at=doc["created_at"],
     )
 
+@timed("serialize")
+def comment_doc_to_dict(doc: dict) -> dict:
+    """CommentOut-shaped dict for FastJSONResponse"""
+    return {
+        "id": doc["_id"],
+        "task_id": doc["task_id"],
+        "author_id": doc["author_id"],
+        "content": doc["content"],
+        "created_at": doc["created_at"],
+    }
+
 # GET /api/v1/tasks/{task_id}/comments - Get task comments
-@app.get("/api/v1/tasks/{task_id}/comments", response_model=List[CommentOut])
-async def get_task_comments(task_id: str):
-    cursor = db.comments.find({"task_id": ObjectId(task_id)}).sort("created_at", 1)
-    comments = [comment_doc_to_out(doc) async for doc in cursor]
-    return comments
+# Returns List[CommentOut] oldest first; with limit/after it returns {"items", "next_cursor"} newest first
+@app.get("/api/v1/tasks/{task_id}/comments")
+async def get_task_comments(
+    task_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+):
+    if limit is None and after is None:
+        cursor = db.comments.find({"task_id": ObjectId(task_id)}).sort("created_at", 1)
+        if FAST_JSON:
+            return FastJSONResponse([comment_doc_to_dict(doc) async for doc in cursor])
+        comments = [comment_doc_to_out(doc) async for doc in cursor]
+        return comments
+
+    comments, next_cursor = await fetch_page(
+        db.comments, {"task_id": ObjectId(task_id)}, limit or DEFAULT_PAGE_SIZE, after, newest_first=True
+    )
+    if FAST_JSON:
+        return FastJSONResponse({"items": [comment_doc_to_dict(doc) for doc in comments], "next_cursor": next_cursor})
+    return {"items": [comment_doc_to_out(doc) for doc in comments], "next_cursor": next_cursor}
+
+class CommentCountsRequest(BaseModel):
+    task_ids: List[str] = Field(..., max_length=MAX_PAGE_SIZE)
+
+# POST /api/v1/tasks/comment_counts - {"task_ids": [...]} -> {task_id: {"comment_count", "last_comment_at"}}
+# Tasks that do not exist or are outside the caller's projects are left out.
+@app.post("/api/v1/tasks/comment_counts")
+async def comment_counts(body: CommentCountsRequest, current_user: dict = Depends(get_current_user)):
+    try:
+        task_ids = [ObjectId(task_id) for task_id in body.task_ids]
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid task id")
+    project_ids = await member_project_ids(current_user["_id"])
+    tasks = db.tasks.find(
+        {"_id": {"$in": task_ids}, "project_id": {"$in": project_ids}}, {"comment_count": 1, "last_comment_at": 1}
+    )
+    return {
+        str(task["_id"]): {"comment_count": task.get("comment_count", 0), "last_comment_at": task.get("last_comment_at")}
+        async for task in tasks
+    }
+
+# Internal sync bookkeeping stays out of exports
+COMMENT_EXPORT_PROJECTION = {"version": 0}
+
+# GET /api/v1/tasks/{task_id}/comments/export - NDJSON, resumable with ?after=<last id>
+@app.get("/api/v1/tasks/{task_id}/comments/export")
+async def export_task_comments(
+    task_id: str,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    task = await db.tasks.find_one({"_id": ObjectId(task_id)}, {"project_id": 1})
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    await check_project_role(task["project_id"], current_user["_id"])
+    return ndjson_response(
+        read_db.comments, {"task_id": task["_id"]}, serialize_doc_fields, batch_size, after,
+        projection=COMMENT_EXPORT_PROJECTION,
+    )
 
 # POST /api/v1/tasks/{task_id}/comments - Add comment
 @app.post("/api/v1/tasks/{task_id}/comments", response_model=CommentOut)
@@ -593,14 +1793,32 @@ async def add_comment(task_id: str, comment: CommentCreate):
         "content": comment.content,
         "created_at": datetime.now(timezone.utc),
     }
-    result = await db.comments.insert_one(comment_doc)
+    # Count the comment on its task, and learn the project, in one round trip
+    task = await db.tasks.find_one_and_update(
+        {"_id": comment_doc["task_id"]},
+        {"$inc": {"comment_count": 1}, "$max": {"last_comment_at": comment_doc["created_at"]}},
+        projection={"project_id": 1},
+    )
+    if task:
+        comment_doc["project_id"] = task["project_id"]
+        comment_doc["version"] = await advance_project(task["project_id"])
+        if comment_doc["version"] is not None:
+            # The task's comment_count changed too, so /changes has to resend it
+            await db.tasks.update_one({"_id": task["_id"]}, {"$max": {"version": comment_doc["version"]}})
+    try:
+        result = await db.comments.insert_one(comment_doc)
+    except Exception:
+        if task:
+            await db.tasks.update_one({"_id": task["_id"]}, {"$inc": {"comment_count": -1}})
+        raise
     comment_doc["_id"] = result.inserted_id
+    if task:
+        record_activity(task["project_id"], "comment.added", comment_doc["author_id"], comment_doc["_id"], task_id=task_id)
     return comment_doc_to_out(comment_doc)
 
 # PUT /api/v1/comments/{comment_id} - Edit comment
 @app.put("/api/v1/comments/{comment_id}", response_model=CommentOut)
-async def edit_comment(comment_id: str, update: CommentUpdate):
-    from pymongo import ReturnDocument
+async def edit_comment(comment_id: str, update: CommentUpdate, actor: Optional[str] = Depends(request_actor)):
     comment = await db.comments.find_one_and_update(
         {"_id": ObjectId(comment_id)},
         {"$set": {"content": update.content}},
@@ -608,31 +1826,175 @@ async def edit_comment(comment_id: str, update: CommentUpdate):
     )
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
+    project_id = await comment_project_id(comment)
+    if project_id:
+        version = await advance_project(project_id)
+        if version is not None:
+            # Also backfills project_id on comments written before it was stored
+            await db.comments.update_one(
+                {"_id": comment["_id"]}, {"$set": {"project_id": project_id}, "$max": {"version": version}}
+            )
+        record_activity(project_id, "comment.edited", actor, comment["_id"], task_id=str(comment["task_id"]))
     return comment_doc_to_out(comment)
 
 # DELETE /api/v1/comments/{comment_id} - Delete comment
 @app.delete("/api/v1/comments/{comment_id}")
-async def delete_comment(comment_id: str):
-    result = await db.comments.delete_one({"_id": ObjectId(comment_id)})
-    if result.deleted_count == 0:
+async def delete_comment(comment_id: str, actor: Optional[str] = Depends(request_actor)):
+    comment = await db.comments.find_one_and_delete(
+        {"_id": ObjectId(comment_id)}, projection={"task_id": 1, "project_id": 1, "created_at": 1}
+    )
+    if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
+    task = await db.tasks.find_one_and_update(
+        {"_id": comment["task_id"]},
+        {"$inc": {"comment_count": -1}},
+        projection={"project_id": 1, "last_comment_at": 1},
+    )
+    if task and task.get("last_comment_at") == comment["created_at"]:
+        # The newest comment went; the one before it is the task's last comment now
+        latest = await db.comments.find_one(
+            {"task_id": comment["task_id"]}, {"created_at": 1}, sort=[("created_at", -1)]
+        )
+        await db.tasks.update_one(
+            {"_id": task["_id"], "last_comment_at": comment["created_at"]},  # unless a newer comment came in meanwhile
+            {"$set": {"last_comment_at": latest["created_at"]}} if latest else {"$unset": {"last_comment_at": ""}},
+        )
+    project_id = comment.get("project_id") or (task["project_id"] if task else None)
+    if project_id:
+        version = await advance_project(project_id)
+        await record_deletions(project_id, "comment", [comment["_id"]], version)
+        if task and version is not None:
+            await db.tasks.update_one({"_id": task["_id"]}, {"$max": {"version": version}})
+        record_activity(project_id, "comment.deleted", actor, comment["_id"], task_id=str(comment["task_id"]))
     return {"message": "Comment deleted successfully"}
+
+async def comment_project_id(comment: dict) -> Optional[ObjectId]:
+    """Comments written before project_id was stored on them get it from their task"""
+    if comment.get("project_id"):
+        return comment["project_id"]
+    task = await db.tasks.find_one({"_id": comment["task_id"]}, {"project_id": 1})
+    return task["project_id"] if task else None
 # -----------------------------
 # Notifications
 # -----------------------------
 
-async def add_notification(message: str, user_id: str):
-    """Add a basic notification to the notifications collection."""
-    await db.notifications.insert_one({
-        "user_id": user_id,  # just store the string, no ObjectId conversion
+def add_notification(message: str, user_id: str, task_id: Optional[ObjectId] = None, type: str = "info"):
+    """Queue a notification; it is written (and streamed) in the next batch, so callers do not wait on Mongo."""
+    notification = {
+        "_id": ObjectId(),
+        "user_id": ObjectId(user_id),  # same type the readers query with
+        "type": type,
+        "task_id": task_id,
         "message": message,
         "read": False,
         "created_at": datetime.now(timezone.utc)
-    })
+    }
+    notification_buffer.add(notification)
+
+# notification_counters holds {_id: user_id, unread: n}. New notifications add to
+# it, and reads or deletes of unread notifications take away from it, so the
+# unread badge is one _id lookup instead of a scan of the user's notifications.
+# Each worker sums those changes per user in unread_deltas and applies them in
+# batches, which keeps the counter off the request path. A user's counter is
+# created by counting their unread notifications, so notifications from before
+# the counters count too; that count already covers the user's pending delta.
+def _unread_delta(delta: int) -> list:
+    return [{"$set": {"unread": {"$max": [0, {"$add": [{"$ifNull": ["$unread", 0]}, delta]}]}}}]
+
+async def seed_unread_counter(user_id: ObjectId) -> Optional[int]:
+    """Create a missing counter from a count; None if another request created it first.
+
+    The count already includes whatever change the caller was about to apply.
+    """
+    unread = await db.notifications.count_documents({"user_id": {"$in": [user_id, str(user_id)]}, "read": False})
+    result = await db.notification_counters.update_one({"_id": user_id}, {"$setOnInsert": {"unread": unread}}, upsert=True)
+    return unread if result.upserted_id is not None else None
+
+async def notifications_written(docs: List[dict]):
+    """on_written hook of notification_buffer: stream what was stored, then count it"""
+    if not NOTIFICATION_CHANGE_STREAM:
+        for doc in docs:
+            publish_notification(doc)
+    for doc in docs:
+        if not doc.get("read"):
+            unread_deltas.add(doc["user_id"], 1)
+
+async def apply_unread_deltas(per_user: Dict[ObjectId, int]):
+    """unread_deltas' apply hook: seed missing counters, then one bulk update for the rest"""
+    per_user = dict(per_user)
+    existing = {doc["_id"] async for doc in db.notification_counters.find({"_id": {"$in": list(per_user)}}, {"_id": 1})}
+    for user_id in set(per_user) - existing:
+        if await seed_unread_counter(user_id) is not None:
+            del per_user[user_id]
+    if per_user:
+        await db.notification_counters.bulk_write(
+            [UpdateOne({"_id": user_id}, _unread_delta(delta)) for user_id, delta in per_user.items()],
+            ordered=False,
+        )
+
+async def discount_unread_count(user_id: ObjectId, delta: int):
+    """Apply delta now, before the change is written; a missing counter is left to be seeded later"""
+    await db.notification_counters.update_one({"_id": user_id}, _unread_delta(delta))
+
+async def get_unread_count(user_id: ObjectId) -> int:
+    counter = await db.notification_counters.find_one({"_id": user_id})
+    if counter is None:
+        # Seeding counts what the pending delta covers: let the flush seed it instead
+        await unread_deltas.flush()
+        counter = await db.notification_counters.find_one({"_id": user_id})
+        if counter is None:
+            unread = await seed_unread_counter(user_id)
+            if unread is not None:
+                return unread
+            counter = await db.notification_counters.find_one({"_id": user_id})
+    return max(0, counter["unread"] + unread_deltas.pending(user_id))
+
+async def rebuild_notification_counters() -> int:
+    """Recount every user's unread notifications; returns the number of counters written"""
+    per_user = {}
+    async for row in db.notifications.aggregate([
+        {"$match": {"read": False}},
+        {"$group": {"_id": "$user_id", "unread": {"$sum": 1}}},
+    ]):
+        user_id = ObjectId(str(row["_id"]))  # older notifications stored the recipient as a string
+        per_user[user_id] = per_user.get(user_id, 0) + row["unread"]
+    await db.notification_counters.update_many({"_id": {"$nin": list(per_user)}}, {"$set": {"unread": 0}})
+    if per_user:
+        await db.notification_counters.bulk_write(
+            [UpdateOne({"_id": user_id}, {"$set": {"unread": count}}, upsert=True) for user_id, count in per_user.items()],
+            ordered=False,
+        )
+    return len(per_user)
+
+async def rebuild_comment_counts() -> int:
+    """Recount comment_count/last_comment_at on every task; returns the number of tasks with comments"""
+    per_task = {}
+    async for row in db.comments.aggregate([
+        {"$group": {"_id": "$task_id", "comment_count": {"$sum": 1}, "last_comment_at": {"$max": "$created_at"}}},
+    ]):
+        per_task[row["_id"]] = {"comment_count": row["comment_count"], "last_comment_at": row["last_comment_at"]}
+    await db.tasks.update_many(
+        {"_id": {"$nin": list(per_task)}}, {"$set": {"comment_count": 0}, "$unset": {"last_comment_at": ""}}
+    )
+    if per_task:
+        await db.tasks.bulk_write(
+            [UpdateOne({"_id": task_id}, {"$set": counts}) for task_id, counts in per_task.items()], ordered=False
+        )
+    return len(per_task)
+
+def publish_notification(notification: dict):
+    """Push a stored notification to the user's open streams"""
+    notification_hub.publish(str(notification["user_id"]), serialize_notification(dict(notification)))
 
+def format_sse(notification: dict) -> str:
+    return f"id: {notification['_id']}\nevent: notification\ndata: {json.dumps(notification)}\n\n"
+
+@timed("serialize")
 def serialize_notification(notification: dict) -> dict:
     notification["_id"] = str(notification["_id"])
     notification["user_id"] = str(notification["user_id"])
+    if notification.get("task_id") is not None:
+        notification["task_id"] = str(notification["task_id"])
     if "created_at" in notification and isinstance(notification["created_at"], datetime):
         notification["created_at"] = notification["created_at"].isoformat()
     if "read_at" in notification and isinstance(notification.get("read_at"), datetime):
@@ -644,37 +2006,263 @@ async def get_notifications(current_user: dict = Depends(get_current_user)):
     notifications = await db.notifications.find(
         {"user_id": ObjectId(current_user["_id"])}
     ).sort("created_at", -1).to_list(100)
+    if FAST_JSON:
+        return FastJSONResponse(notifications)
     return [serialize_notification(n) for n in notifications]
 
-@app.put("/api/v1/notifications/{notification_id}/read")
-async def mark_as_read(notification_id: str, current_user: dict = Depends(get_current_user)):
-    notif = await db.notifications.find_one({"_id": ObjectId(notification_id)})
-    if not notif:
-        raise HTTPException(status_code=404, detail="Notification not found")
-    if str(notif["user_id"]) != str(current_user["_id"]):
+@app.get("/api/v1/notifications/unread_count")
+async def unread_count(current_user: dict = Depends(get_current_user)):
+    return {"unread": await get_unread_count(current_user["_id"])}
+
+@app.post("/api/v1/notifications/mark_all_read")
+async def mark_all_read(current_user: dict = Depends(get_current_user)):
+    user_id = current_user["_id"]
+    result = await db.notifications.update_many(
+        {"user_id": {"$in": [user_id, str(user_id)]}, "read": False},
+        {"$set": {"read": True, "read_at": datetime.now(timezone.utc)}},
+    )
+    if result.modified_count:
+        unread_deltas.add(user_id, -result.modified_count)
+    return {"updated": result.modified_count}
+
+# DELETE /api/v1/notifications/read - registered before /{notification_id}, which would otherwise match it
+@app.delete("/api/v1/notifications/read")
+async def delete_read_notifications(current_user: dict = Depends(get_current_user)):
+    user_id = current_user["_id"]
+    result = await db.notifications.delete_many({"user_id": {"$in": [user_id, str(user_id)]}, "read": True})
+    return {"deleted": result.deleted_count}
+
+@app.get("/api/v1/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    """Server-Sent Events feed of new notifications; replays missed ones on reconnect via Last-Event-ID"""
+    replay_after = parse_checkpoint(last_event_id)
+
+    async def events():
+        last_sent = replay_after
+        # Subscribe inside the generator so the finally below always releases it (a response that is
+        # never sent never subscribes), and before replaying so nothing inserted in between is lost
+        subscription = notification_hub.subscribe(str(current_user["_id"]))
+        try:
+            yield "retry: 3000\n\n"
+            if replay_after is not None:
+                missed = db.notifications.find(
+                    {"user_id": ObjectId(current_user["_id"]), "_id": {"$gt": replay_after}}
+                ).sort("_id", 1).limit(NOTIFICATION_REPLAY_LIMIT)
+                async for notification in missed:
+                    last_sent = notification["_id"]
+                    yield format_sse(serialize_notification(notification))
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=NOTIFICATION_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is CLOSE:
+                    break
+                if last_sent is not None and ObjectId(event["_id"]) <= last_sent:
+                    continue  # already sent during replay
+                yield format_sse(event)
+        finally:
+            notification_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/v1/notifications/export")
+async def export_notifications(
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    return ndjson_response(
+        read_db.notifications, {"user_id": ObjectId(current_user["_id"])}, serialize_notification, batch_size, after
+    )
+
+def own_notification_filter(notification_id: str, current_user: dict) -> dict:
+    # Older notifications stored the recipient as a string
+    return {"_id": ObjectId(notification_id), "user_id": {"$in": [current_user["_id"], str(current_user["_id"])]}}
+
+async def raise_notification_error(notification_id: str):
+    """Only runs when a conditional notification write matched nothing"""
+    if await db.notifications.find_one({"_id": ObjectId(notification_id)}, {"_id": 1}):
         raise HTTPException(status_code=403, detail="Access denied")
+    raise HTTPException(status_code=404, detail="Notification not found")
 
-    await db.notifications.update_one(
-        {"_id": ObjectId(notification_id)},
-        {"$set": {"read": True, "read_at": datetime.now(timezone.utc)}}
+@app.put("/api/v1/notifications/{notification_id}/read")
+async def mark_as_read(notification_id: str, current_user: dict = Depends(get_current_user)):
+    read_state = {"read": True, "read_at": datetime.now(timezone.utc)}
+    previous = await db.notifications.find_one_and_update(
+        own_notification_filter(notification_id, current_user),
+        {"$set": read_state},
+        return_document=ReturnDocument.BEFORE,
     )
-    updated = await db.notifications.find_one({"_id": ObjectId(notification_id)})
-    return serialize_notification(updated)
+    if not previous:
+        await raise_notification_error(notification_id)
+    if not previous.get("read"):
+        unread_deltas.add(current_user["_id"], -1)
+    return serialize_notification({**previous, **read_state})
 
 @app.delete("/api/v1/notifications/{notification_id}")
 async def delete_notification(notification_id: str, current_user: dict = Depends(get_current_user)):
-    notif = await db.notifications.find_one({"_id": ObjectId(notification_id)})
-    if not notif:
-        raise HTTPException(status_code=404, detail="Notification not found")
-    if str(notif["user_id"]) != str(current_user["_id"]):
-        raise HTTPException(status_code=403, detail="Access denied")
-
-    await db.notifications.delete_one({"_id": ObjectId(notification_id)})
+    deleted = await db.notifications.find_one_and_delete(
+        own_notification_filter(notification_id, current_user), projection={"read": 1}
+    )
+    if not deleted:
+        await raise_notification_error(notification_id)
+    if not deleted.get("read"):
+        unread_deltas.add(current_user["_id"], -1)
     return {"message": "Notification deleted successfully"}
 
+# -----------------------------
+# Cascading deletes
+# -----------------------------
+# Run by deletion_jobs in the background; each step deletes by query, so a job
+# resumed after a restart just carries on with what is left.
+@deletion_jobs.handler("project")
+async def cascade_project(ctx, job: dict):
+    for project_id in job["target_ids"]:
+        await db.projects.update_one({"_id": project_id}, {"$set": {"deleting": True}})
+        await ctx.delete_in_batches(
+            "tasks", db.tasks, {"project_id": project_id}, before_batch=lambda task_ids: delete_task_children(ctx, task_ids)
+        )
+        # Comments left behind by tasks deleted before deletes cascaded
+        await ctx.delete_in_batches("comments", db.comments, {"project_id": project_id})
+        await ctx.delete_in_batches("tombstones", db.tombstones, {"project_id": project_id})
+        await ctx.delete_in_batches("activity", db.activity, {"project_id": project_id})
+        await db.projects.delete_one({"_id": project_id})
+        invalidate_task_search(project_id)
+        activity_recent.invalidate(project_id)
+
+@deletion_jobs.handler("tasks")
+async def cascade_tasks(ctx, job: dict):
+    await delete_task_children(ctx, job["target_ids"])
+
+async def delete_task_children(ctx, task_ids: list):
+    await ctx.delete_in_batches("comments", db.comments, {"task_id": {"$in": task_ids}})
+    await ctx.delete_in_batches(
+        "notifications", db.notifications, {"task_id": {"$in": task_ids}}, before_batch=discount_unread_notifications
+    )
+
+async def discount_unread_notifications(notification_ids: list):
+    """Take unread notifications out of their recipients' counters before they are deleted"""
+    await unread_deltas.flush()  # the counters must already include these notifications
+    async for row in db.notifications.aggregate([
+        {"$match": {"_id": {"$in": notification_ids}, "read": False}},
+        {"$group": {"_id": "$user_id", "unread": {"$sum": 1}}},
+    ]):
+        await discount_unread_count(ObjectId(str(row["_id"])), -row["unread"])
+
+# GET /api/v1/deletion_jobs/{job_id} - progress of a background delete
+@app.get("/api/v1/deletion_jobs/{job_id}")
+async def get_deletion_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await deletion_jobs.get(job_id)
+    if not job or job.get("requested_by") not in (None, current_user["_id"]):
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return {
+        "id": job["_id"],
+        "kind": job["kind"],
+        "target_ids": [str(target_id) for target_id in job["target_ids"]],
+        "status": job["status"],
+        "deleted": job["deleted"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "finished_at": job["finished_at"],
+    }
+
+# -----------------------------
+# Dashboard
+# -----------------------------
+async def _timed(name: str, awaitable, timings: dict):
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000
+
+def server_timing(timings: dict) -> str:
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in timings.items())
+
+@app.get("/api/v1/dashboard")
+async def get_dashboard(
+    response: Response,
+    notifications_limit: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+):
+    """Projects, task counts per status, latest notifications and the unread count, fetched concurrently"""
+    started = time.perf_counter()
+    timings = {}
+    user_id = current_user["_id"]
+
+    async def load_projects_and_task_counts():
+        projects = await _timed(
+            "projects", db.projects.find({"members.user_id": user_id, "deleting": {"$ne": True}}).to_list(100), timings
+        )
+        facets = await _timed("tasks", db.tasks.aggregate([
+            {"$match": {"project_id": {"$in": [p["_id"] for p in projects]}}},
+            {"$facet": {
+                "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "by_project": [{"$group": {"_id": {"project_id": "$project_id", "status": "$status"}, "count": {"$sum": 1}}}],
+            }},
+        ]).to_list(1), timings)
+        return projects, facets[0] if facets else {"by_status": [], "by_project": []}
+
+    (projects, task_facets), latest, unread = await asyncio.gather(
+        load_projects_and_task_counts(),
+        _timed("notifications", db.notifications.find(
+            {"user_id": ObjectId(user_id)}
+        ).sort("created_at", -1).to_list(notifications_limit), timings),
+        _timed("unread", get_unread_count(ObjectId(user_id)), timings),
+    )
+
+    project_task_counts = {str(p["_id"]): {} for p in projects}
+    for row in task_facets["by_project"]:
+        project_task_counts[str(row["_id"]["project_id"])][row["_id"]["status"]] = row["count"]
+
+    timings["total"] = (time.perf_counter() - started) * 1000
+    body = {
+        "projects": projects,
+        "task_counts": {row["_id"]: row["count"] for row in task_facets["by_status"]},
+        "project_task_counts": project_task_counts,
+        "unread_notifications": unread,
+        "notifications": latest,
+    }
+    if FAST_JSON:
+        return FastJSONResponse(body, headers={"Server-Timing": server_timing(timings)})
+    response.headers["Server-Timing"] = server_timing(timings)
+    body["projects"] = [serialize_project(p) for p in projects]
+    body["notifications"] = [serialize_notification(n) for n in body["notifications"]]
+    return body
+
 # -----------------------------
 # Run FastAPI
 # -----------------------------
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    import sys
+
+    async def run_offline(job):
+        init_db.connect()
+        try:
+            return await job()
+        finally:
+            init_db.close()
+
+    if "--rebuild-notification-counters" in sys.argv:
+        print("Counters updated:", asyncio.run(run_offline(rebuild_notification_counters)))
+    elif "--rebuild-progress" in sys.argv:
+        print("Projects updated:", asyncio.run(run_offline(rebuild_project_progress)))
+    elif "--rebuild-comment-counts" in sys.argv:
+        print("Tasks with comments:", asyncio.run(run_offline(rebuild_comment_counts)))
+    else:
+        import uvicorn
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
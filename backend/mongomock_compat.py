@@ -0,0 +1,52 @@
+"""Fill the gaps between mongomock and what main.py sends to MongoDB.
+
+The benchmarks and tests run the app against mongomock-motor. Call
+patch_mongomock() once before they do; it is a no-op on later calls.
+
+- $round: the progress counters round completion_percentage with it, and
+  mongomock's expression parser does not know it.
+- sort= on bulk UpdateOne/ReplaceOne/DeleteOne: pymongo passes it to the
+  bulk builder, whose mongomock version does not take it. The app only uses
+  those operations with _id filters, so the sort is dropped.
+"""
+import functools
+
+_patched = False
+
+
+def _add_round():
+    from mongomock import aggregate
+
+    handle_arithmetic = aggregate._Parser._handle_arithmetic_operator
+
+    def handle_round(self, operator, values):
+        if operator != "$round":
+            return handle_arithmetic(self, operator, values)
+        number, place = (list(self.parse_many(values)) + [0])[:2] if isinstance(values, list) else (self.parse(values), 0)
+        return None if number is None else round(number, place)
+
+    aggregate.arithmetic_operators.add("$round")
+    aggregate._Parser._handle_arithmetic_operator = handle_round
+
+
+def _drop_bulk_sort():
+    from mongomock.collection import BulkOperationBuilder
+
+    for name in ("add_update", "add_replace", "add_delete"):
+        method = getattr(BulkOperationBuilder, name)
+
+        @functools.wraps(method)
+        def without_sort(self, *args, _method=method, **kwargs):
+            kwargs.pop("sort", None)
+            return _method(self, *args, **kwargs)
+
+        setattr(BulkOperationBuilder, name, without_sort)
+
+
+def patch_mongomock():
+    global _patched
+    if _patched:
+        return
+    _add_round()
+    _drop_bulk_sort()
+    _patched = True
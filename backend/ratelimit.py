@@ -0,0 +1,247 @@
+"""Token-bucket rate limiting and request admission control.
+
+- RateLimiter charges one token per request against a bucket per key (route
+  plus IP or user id). MemoryBackend keeps the buckets in this process;
+  MongoBackend shares them between workers through one atomic
+  find_one_and_update per decision. Both are O(1) per request.
+- AdmissionController / AdmissionControlMiddleware cap the number of
+  requests being handled at once and shed the rest with 503 + Retry-After
+  instead of letting the event loop queue grow without bound.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from pymongo import ReturnDocument
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger("synergysphere.ratelimit")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | mongo
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Use the first X-Forwarded-For address; only safe behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "256"))  # 0 disables admission control
+MAX_WAITING_REQUESTS = int(os.getenv("MAX_WAITING_REQUESTS", "512"))
+ADMISSION_WAIT_SECONDS = float(os.getenv("ADMISSION_WAIT_SECONDS", "2.0"))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Limit(NamedTuple):
+    rate: float   # tokens added per second
+    burst: float  # bucket size
+
+
+def parse_limit(spec: str) -> Limit:
+    """'10/minute' -> 10 requests per minute, bursting up to 10"""
+    count, _, period = spec.partition("/")
+    seconds = PERIODS.get(period.strip().rstrip("s") or "second")
+    if seconds is None:
+        raise ValueError(f"Unknown rate limit period in {spec!r}; expected one of {', '.join(PERIODS)}")
+    return Limit(rate=float(count) / seconds, burst=float(count))
+
+
+class MemoryBackend:
+    """Buckets in a bounded LRU dict; evicting an idle bucket only refills it early"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, updated_at]
+
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        """Spend cost tokens; returns 0 when allowed, else seconds until enough have refilled"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[key] = [limit.burst, now]
+        else:
+            bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        return (cost - bucket[0]) / limit.rate
+
+    def stats(self) -> dict:
+        return {"kind": "memory", "keys": len(self._buckets), "max_keys": self.max_keys}
+
+
+class MongoBackend:
+    """Buckets shared by every worker, refilled and spent in a single pipeline update.
+
+    Uses the server clock ($$NOW) so workers with skewed clocks agree. Idle
+    buckets expire through the TTL index on expires_at.
+    """
+
+    def __init__(self, get_collection: Callable):
+        self.get_collection = get_collection
+
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        refilled = {"$min": [limit.burst, {"$add": [{"$ifNull": ["$tokens", limit.burst]}, {"$multiply": [elapsed, limit.rate]}]}]}
+        bucket = await self.get_collection().find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                    # A bucket untouched for this long is full again, so it can go
+                    "expires_at": {"$add": ["$$NOW", int(math.ceil(limit.burst / limit.rate * 1000))]},
+                }},
+            ],
+            projection={"tokens": 1, "allowed": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if bucket["allowed"]:
+            return 0.0
+        return (cost - bucket["tokens"]) / limit.rate
+
+    def stats(self) -> dict:
+        return {"kind": "mongo"}
+
+
+class RateLimiter:
+    def __init__(self, backend, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend
+        self.enabled = enabled
+        self.allowed = 0
+        self.limited = 0
+        self.backend_errors = 0
+
+    async def hit(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        """0 when the request may proceed, otherwise the Retry-After in seconds"""
+        if not self.enabled:
+            return 0.0
+        try:
+            retry_after = await self.backend.take(key, limit, cost)
+        except Exception:
+            # A shared backend outage must not take the API down with it
+            self.backend_errors += 1
+            logger.exception("Rate limit backend failed; allowing %s", key)
+            return 0.0
+        if retry_after:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "backend_errors": self.backend_errors,
+            **self.backend.stats(),
+        }
+
+
+def client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+class AdmissionController:
+    """Bounds concurrent requests.
+
+    Up to max_concurrent requests run at once. Up to max_waiting more wait at
+    most wait_seconds for a slot; everything beyond that is turned away.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_REQUESTS, max_waiting: int = MAX_WAITING_REQUESTS,
+                 wait_seconds: float = ADMISSION_WAIT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_seconds = wait_seconds
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    async def acquire(self) -> bool:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        if self._slots.locked():
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.wait_seconds)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_waiting": self.max_waiting,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionControlMiddleware:
+    """Pure ASGI middleware: 503 + Retry-After when the controller has no slot.
+
+    Long-lived streams belong in exempt_prefixes, or they would hold a slot
+    for the whole connection.
+    """
+
+    def __init__(self, app, controller: AdmissionController, exempt_prefixes: Iterable[str] = ()):
+        self.app = app
+        self.controller = controller
+        self.exempt_prefixes = tuple(exempt_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.controller.enabled or scope["path"].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+        if not await self.controller.acquire():
+            response = JSONResponse(
+                {"detail": "Server busy, try again"},
+                status_code=503,
+                headers={"Retry-After": retry_after_header(self.controller.wait_seconds)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
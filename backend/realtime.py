@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import Callable, Dict, Optional, Set
+
+logger = logging.getLogger("synergysphere.realtime")
+
+# Pushed to a subscription when it has to be closed (slow consumer or shutdown).
+# The client reconnects with Last-Event-ID and replays what it missed from Mongo.
+CLOSE = object()
+
+
+class Subscription:
+    def __init__(self, user_id: str, queue_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def push(self, event) -> bool:
+        """Queue an event without blocking; returns False if the subscriber fell behind"""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.close()
+            return False
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # Make room for the close marker so the reader wakes up straight away
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(CLOSE)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class NotificationHub:
+    """In-process fan-out of notification events to connected users.
+
+    Each connection gets a bounded queue. A connection that cannot keep up is
+    closed instead of letting its queue (or the publisher) grow without bound.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, event: dict):
+        self.published += 1
+        for subscription in list(self._subscribers.get(user_id, ())):
+            if subscription.push(event):
+                self.delivered += 1
+            else:
+                self.overflows += 1
+                self.unsubscribe(subscription)
+
+    def close(self):
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                subscription.close()
+        self._subscribers.clear()
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._subscribers),
+            "connections": sum(len(s) for s in self._subscribers.values()),
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+        }
+
+
+async def watch_inserts(collection, on_insert: Callable[[dict], None], retry_delay: float = 5.0):
+    """Feed inserts from a MongoDB change stream to on_insert, resuming after errors.
+
+    Lets every uvicorn worker see notifications written by any other worker.
+    Requires a replica set or Atlas cluster.
+    """
+    resume_token: Optional[dict] = None
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    while True:
+        try:
+            async with collection.watch(pipeline, resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    on_insert(change["fullDocument"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Change stream on %s failed, retrying in %ss", collection.name, retry_delay)
+            await asyncio.sleep(retry_delay)
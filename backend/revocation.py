@@ -0,0 +1,220 @@
+"""Revoked JWTs, checked in memory on every authenticated request.
+
+Revocations live in the revoked_tokens collection, keyed by the token's jti,
+and drop out through a TTL index once the token would have expired anyway.
+Each worker mirrors them as an exact set backed by a Bloom filter:
+
+- The set answers every check while it holds all live revocations.
+- Past REVOCATION_EXACT_MAX_SIZE entries it keeps only the newest. A token
+  that then hits the Bloom filter but not the set is looked up in MongoDB,
+  which happens for evicted revocations and false positives only.
+
+Workers pick up each other's revocations by polling for revoked_at newer
+than what they have seen, and reload everything (rebuilding the filter
+without expired entries) every REVOCATION_RELOAD_SECONDS. claim() is the
+exception: it inserts the revocation and fails if the jti was already
+there, so a refresh token can be used exactly once across all workers.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("synergysphere.revocation")
+
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+REVOCATION_RELOAD_SECONDS = float(os.getenv("REVOCATION_RELOAD_SECONDS", "3600"))
+REVOCATION_EXACT_MAX_SIZE = int(os.getenv("REVOCATION_EXACT_MAX_SIZE", "200000"))
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "1000000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+# revoked_at comes from each worker's clock; poll this far back to allow for skew and slow inserts
+REVOCATION_CLOCK_SKEW_SECONDS = float(os.getenv("REVOCATION_CLOCK_SKEW_SECONDS", "30"))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing of one blake2b digest)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    def __init__(self, get_collection: Callable, refresh_interval: float = REVOCATION_REFRESH_SECONDS,
+                 reload_interval: float = REVOCATION_RELOAD_SECONDS, exact_max_size: int = REVOCATION_EXACT_MAX_SIZE,
+                 bloom_capacity: int = REVOCATION_BLOOM_CAPACITY, bloom_error_rate: float = REVOCATION_BLOOM_ERROR_RATE):
+        self.get_collection = get_collection
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+        self.exact_max_size = exact_max_size
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self._bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        self._exact = {}  # jti -> expires_at, oldest revocation first
+        self._complete = True  # False once the exact set has dropped entries
+        self._seen_until: Optional[datetime] = None
+        self._added_during_reload: Optional[dict] = None  # jti -> expires_at while reload() reads
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.revoked_hits = 0
+        self.db_lookups = 0
+        self.refresh_errors = 0
+
+    def _add(self, bloom: BloomFilter, exact: dict, jti: str, expires_at: Optional[datetime]) -> bool:
+        """Add to the given filter and set; True if the set had to drop its oldest entry"""
+        if jti in exact:
+            return False
+        bloom.add(jti)
+        exact[jti] = expires_at
+        if len(exact) > self.exact_max_size:
+            del exact[next(iter(exact))]
+            return True
+        return False
+
+    def _remember(self, jti: str, expires_at: Optional[datetime]):
+        if self._added_during_reload is not None:
+            self._added_during_reload[jti] = expires_at
+        if self._add(self._bloom, self._exact, jti, expires_at):
+            self._complete = False
+
+    async def is_revoked(self, jti: str) -> bool:
+        self.checks += 1
+        revoked = False
+        if jti in self._bloom:
+            if jti in self._exact:
+                revoked = True
+            elif not self._complete:
+                self.db_lookups += 1
+                revoked = await self.get_collection().find_one({"_id": jti}, {"_id": 1}) is not None
+        self.revoked_hits += revoked
+        return revoked
+
+    async def revoke(self, jti: str, expires_at: datetime, user_id: Optional[str] = None, reason: str = "logout"):
+        """Revoke a token; revoking it twice is harmless"""
+        self._remember(jti, expires_at)
+        now = datetime.now(timezone.utc)
+        await self.get_collection().update_one(
+            {"_id": jti},
+            {"$setOnInsert": {"expires_at": expires_at, "revoked_at": now, "user_id": user_id, "reason": reason}},
+            upsert=True,
+        )
+
+    async def claim(self, jti: str, expires_at: datetime, user_id: Optional[str] = None) -> bool:
+        """Revoke a token that is being exchanged; False if it had already been used or revoked"""
+        try:
+            await self.get_collection().insert_one({
+                "_id": jti,
+                "expires_at": expires_at,
+                "revoked_at": datetime.now(timezone.utc),
+                "user_id": user_id,
+                "reason": "rotated",
+            })
+        except DuplicateKeyError:
+            self._remember(jti, expires_at)
+            return False
+        self._remember(jti, expires_at)
+        return True
+
+    async def reload(self):
+        """Rebuild from every live revocation, dropping expired ones from the filter.
+
+        The new filter and set are filled on the side and swapped in once the
+        cursor is exhausted, so checks keep using the old ones meanwhile.
+        """
+        now = datetime.now(timezone.utc)
+        started = now - timedelta(seconds=REVOCATION_CLOCK_SKEW_SECONDS)
+        self._added_during_reload = {}
+        try:
+            count = await self.get_collection().count_documents({"expires_at": {"$gt": now}})
+            bloom = BloomFilter(max(self.bloom_capacity, 2 * count), self.bloom_error_rate)
+            exact = {}
+            complete = True
+            cursor = self.get_collection().find({"expires_at": {"$gt": now}}, {"expires_at": 1}).sort("revoked_at", 1)
+            async for doc in cursor:
+                complete &= not self._add(bloom, exact, doc["_id"], doc.get("expires_at"))
+            # revoke()/claim() calls that landed while the cursor was being read
+            for jti, expires_at in self._added_during_reload.items():
+                complete &= not self._add(bloom, exact, jti, expires_at)
+        finally:
+            self._added_during_reload = None
+        self._bloom, self._exact, self._complete = bloom, exact, complete
+        self._seen_until = started
+
+    async def refresh(self):
+        """Pick up revocations made by other workers since the last refresh"""
+        if self._seen_until is None:
+            await self.reload()
+            return
+        now = datetime.now(timezone.utc)
+        cursor = self.get_collection().find(
+            {"revoked_at": {"$gte": self._seen_until}}, {"expires_at": 1}
+        ).sort("revoked_at", 1)
+        async for doc in cursor:
+            self._remember(doc["_id"], doc.get("expires_at"))
+        self._seen_until = now - timedelta(seconds=REVOCATION_CLOCK_SKEW_SECONDS)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        reload_at = loop.time() + self.reload_interval
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if loop.time() >= reload_at:
+                    await self.reload()
+                    reload_at = loop.time() + self.reload_interval
+                else:
+                    await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.refresh_errors += 1
+                logger.exception("Refreshing revoked tokens failed")
+
+    async def start(self):
+        await self.reload()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "exact": len(self._exact),
+            "exact_max_size": self.exact_max_size,
+            "complete": self._complete,
+            "bloom_bits": self._bloom.size,
+            "bloom_hashes": self._bloom.hashes,
+            "bloom_entries": self._bloom.count,
+            "checks": self.checks,
+            "revoked_hits": self.revoked_hits,
+            "db_lookups": self.db_lookups,
+            "refresh_errors": self.refresh_errors,
+        }
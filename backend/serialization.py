@@ -0,0 +1,46 @@
+"""Single-pass JSON encoding for API responses.
+
+FastJSONResponse renders with orjson when it is installed (ObjectId through
+the default hook, datetime natively) and with the standard library json
+module otherwise. A route that returns it directly skips jsonable_encoder and
+response-model validation, so list endpoints can hand it documents straight
+from the cursor.
+"""
+import json
+import os
+from datetime import date, datetime
+from typing import Any
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Return raw documents from list endpoints instead of building response models
+FAST_JSON = os.getenv("FAST_JSON", "true").lower() in ("1", "true", "yes")
+
+
+def json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, default=json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,17 @@
+"""Shared setup: the app runs in-process against mongomock, like benchmarks/run.py.
+
+    cd backend
+    python -m pytest tests
+"""
+import os
+import sys
+
+os.environ.setdefault("ENSURE_INDEXES", "false")
+os.environ.setdefault("INDEX_VERIFY", "off")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongomock_compat import patch_mongomock  # noqa: E402
+
+patch_mongomock()
@@ -0,0 +1,92 @@
+"""Batch task writes keep the project's progress counters exact."""
+import asyncio
+
+import httpx
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+import init_db
+import main
+
+
+class _Database:
+    """Hands out one tasks collection, so a test can wrap its methods"""
+
+    def __init__(self, database):
+        self.database = database
+        self.tasks = database.tasks
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+
+class _AfterReadCursor:
+    """Runs after_read once the cursor is exhausted, as if a request ran meanwhile"""
+
+    def __init__(self, cursor, after_read):
+        self.cursor = cursor
+        self.after_read = after_read
+
+    async def __aiter__(self):
+        async for doc in self.cursor:
+            yield doc
+        await self.after_read()
+
+
+async def _batch_against_concurrent_update():
+    database = _Database(AsyncMongoMockClient()["synergysphere_test"])
+    init_db.bind(database)
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            r = await client.post("/api/v1/auth/register", json={"username": "alice", "email": "a@x.com", "password": "pw"})
+            headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+            me = (await client.get("/api/v1/users/me", headers=headers)).json()
+            org = (await client.post("/organizations", json={"name": "org"}, headers=headers)).json()["organization_id"]
+            project_id = (await client.post("/api/v1/projects", json={"name": "p", "organization_id": org},
+                                            headers=headers)).json()["_id"]
+            batch_url = f"/api/v1/projects/{project_id}/tasks:batch"
+            operations = [{"op": "create", "data": {"title": f"t{i}", "creator_id": me["id"]}} for i in range(3)]
+            operations.append({"op": "create", "data": {"title": "done", "status": "completed", "creator_id": me["id"]}})
+            first, second, third, fourth = [
+                result["task_id"] for result in
+                (await client.post(batch_url, json={"operations": operations}, headers=headers)).json()["results"]
+            ]
+
+            repeated = await client.post(batch_url, json={"operations": [
+                {"op": "update", "task_id": first, "data": {"status": "completed"}},
+                {"op": "delete", "task_id": first},
+            ]}, headers=headers)
+
+            tasks = database.tasks
+            find = tasks.find
+            raced = []
+
+            async def complete_second():
+                # A single-task update lands between the batch's read and its write
+                raced.append(second)
+                await tasks.update_one({"_id": ObjectId(second)}, {"$set": {"status": "completed"}})
+                await main.advance_project(ObjectId(project_id), completed=1)
+
+            tasks.find = lambda *args, **kwargs: _AfterReadCursor(find(*args, **kwargs), complete_second)
+            r = await client.post(batch_url, json={"operations": [
+                {"op": "update", "task_id": first, "data": {"status": "completed"}},
+                {"op": "update", "task_id": second, "data": {"status": "completed"}},
+                {"op": "delete", "task_id": third},
+                {"op": "update", "task_id": fourth, "data": {"status": "in_progress", "title": "reopened"}},
+            ]}, headers=headers)
+            tasks.find = find
+
+            project = await database.projects.find_one({"_id": ObjectId(project_id)})
+            reopened = await database.tasks.find_one({"_id": ObjectId(fourth)})
+            return repeated.status_code, r.json()["succeeded"], raced, project["progress"], reopened
+
+
+def test_batch_counts_transitions_from_the_writes():
+    repeated_status, succeeded, raced, progress, reopened = asyncio.run(_batch_against_concurrent_update())
+    assert repeated_status == 422
+    assert succeeded == 4
+    assert raced
+    assert (reopened["status"], reopened["title"]) == ("in_progress", "reopened")
+    assert progress["tasks_total"] == 3
+    assert progress["tasks_completed"] == 2
@@ -0,0 +1,45 @@
+"""Delta sync pages through more changes than fit in one response."""
+import asyncio
+
+import httpx
+from mongomock_motor import AsyncMongoMockClient
+
+import init_db
+import main
+
+
+async def _page_through_changes(monkeypatch):
+    monkeypatch.setattr(main, "CHANGES_MAX_RESULTS", 5)
+    init_db.bind(AsyncMongoMockClient()["synergysphere_test"])
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            r = await client.post("/api/v1/auth/register", json={"username": "alice", "email": "a@x.com", "password": "pw"})
+            headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+            me = (await client.get("/api/v1/users/me", headers=headers)).json()
+            org = (await client.post("/organizations", json={"name": "org"}, headers=headers)).json()["organization_id"]
+            project_id = (await client.post("/api/v1/projects", json={"name": "p", "organization_id": org},
+                                            headers=headers)).json()["_id"]
+            for batch in range(3):
+                operations = [{"op": "create", "data": {"title": f"t{batch}-{i}", "creator_id": me["id"]}} for i in range(3)]
+                r = await client.post(f"/api/v1/projects/{project_id}/tasks:batch", json={"operations": operations},
+                                      headers=headers)
+                assert r.json()["succeeded"] == 3
+
+            since, seen, calls = 0, set(), 0
+            while True:
+                calls += 1
+                assert calls <= 10, "delta sync stopped advancing"
+                page = (await client.get(f"/api/v1/projects/{project_id}/changes?since={since}", headers=headers)).json()
+                seen.update(task["title"] for task in page["tasks"])
+                if not page["truncated"]:
+                    break
+                assert page["version"] > since
+                since = page["version"]
+            return seen, calls
+
+
+def test_changes_pages_past_the_cap(monkeypatch):
+    seen, calls = asyncio.run(_page_through_changes(monkeypatch))
+    assert seen == {f"t{batch}-{i}" for batch in range(3) for i in range(3)}
+    assert calls > 1
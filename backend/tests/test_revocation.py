@@ -0,0 +1,50 @@
+"""RevocationList keeps answering from its old state while reload() reads."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from revocation import RevocationList
+
+
+class _InterleavedCursor:
+    """Runs on_row before yielding each document, as if requests ran meanwhile"""
+
+    def __init__(self, cursor, on_row):
+        self.cursor = cursor
+        self.on_row = on_row
+
+    def sort(self, *args):
+        self.cursor = self.cursor.sort(*args)
+        return self
+
+    async def __aiter__(self):
+        async for doc in self.cursor:
+            await self.on_row()
+            yield doc
+
+
+async def _reload_while_checking():
+    collection = AsyncMongoMockClient()["synergysphere_test"]["revoked_tokens"]
+    revocations = RevocationList(lambda: collection)
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    await revocations.revoke("logged-out", expires_at)
+
+    checks = []
+
+    async def during_reload():
+        checks.append(await revocations.is_revoked("logged-out"))
+        await revocations.revoke("revoked-during-reload", expires_at)
+
+    find = collection.find
+    collection.find = lambda *args, **kwargs: _InterleavedCursor(find(*args, **kwargs), during_reload)
+    await revocations.reload()
+    collection.find = find
+    return checks, await revocations.is_revoked("logged-out"), await revocations.is_revoked("revoked-during-reload")
+
+
+def test_reload_keeps_revocations_visible():
+    checks, logged_out, revoked_during_reload = asyncio.run(_reload_while_checking())
+    assert checks and all(checks)
+    assert logged_out
+    assert revoked_during_reload
@@ -0,0 +1,63 @@
+"""Project, member and notification mutations each take one MongoDB round trip."""
+import asyncio
+from datetime import datetime, timezone
+
+import httpx
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+import init_db
+import main
+from benchmarks.run import CountingDatabase
+
+
+async def _drain_buffers():
+    # Writes queued by earlier requests must not land inside the next measurement
+    await main.activity_buffer.flush()
+    await main.notification_buffer.flush()
+    await main.unread_deltas.flush()
+
+
+async def _measure_mutations():
+    counting_db = CountingDatabase(AsyncMongoMockClient()["synergysphere_test"])
+    init_db.bind(counting_db)
+    round_trips = {}
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            r = await client.post("/api/v1/auth/register", json={"username": "alice", "email": "a@x.com", "password": "pw"})
+            headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+            await client.post("/api/v1/auth/register", json={"username": "bob", "email": "b@x.com", "password": "pw"})
+            me = (await client.get("/api/v1/users/me", headers=headers)).json()
+            bob = (await client.get("/api/v1/users/search?q=bob", headers=headers)).json()[0]
+            org = (await client.post("/organizations", json={"name": "org"}, headers=headers)).json()["organization_id"]
+            project_id = (await client.post("/api/v1/projects", json={"name": "p", "organization_id": org},
+                                            headers=headers)).json()["_id"]
+            notification_id = ObjectId()
+            await counting_db.notifications.insert_one({
+                "_id": notification_id, "user_id": ObjectId(me["id"]), "type": "info", "task_id": None,
+                "message": "hello", "read": False, "created_at": datetime.now(timezone.utc),
+            })
+
+            mutations = {
+                "update_project": ("PUT", f"/api/v1/projects/{project_id}", {"description": "updated"}),
+                "add_member": ("POST", f"/api/v1/projects/{project_id}/members", {"user_id": bob["id"], "role": "viewer"}),
+                "remove_member": ("DELETE", f"/api/v1/projects/{project_id}/members/{bob['id']}", None),
+                "mark_as_read": ("PUT", f"/api/v1/notifications/{notification_id}/read", None),
+            }
+            for name, (method, path, body) in mutations.items():
+                await _drain_buffers()
+                before = counting_db.round_trips[0]
+                r = await client.request(method, path, json=body, headers=headers)
+                assert r.status_code == 200, (name, r.text)
+                round_trips[name] = counting_db.round_trips[0] - before
+
+            await _drain_buffers()
+            unread = (await client.get("/api/v1/notifications/unread_count", headers=headers)).json()["unread"]
+    return round_trips, unread
+
+
+def test_mutations_take_one_round_trip():
+    round_trips, unread = asyncio.run(_measure_mutations())
+    assert round_trips == {"update_project": 1, "add_member": 1, "remove_member": 1, "mark_as_read": 1}
+    assert unread == 0
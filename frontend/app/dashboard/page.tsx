@@ -17,6 +17,7 @@ export default function DashboardPage() {
   const { user } = useAuth()
   const [projects, setProjects] = useState<Project[]>([])
   const [notifications, setNotifications] = useState<Notification[]>([])
+  const [unreadCount, setUnreadCount] = useState(0)
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
@@ -25,12 +26,10 @@ export default function DashboardPage() {
 
   const loadDashboardData = async () => {
     try {
-      const [projectsData, notificationsData] = await Promise.all([
-        apiClient.getProjects(),
-        apiClient.getNotifications(),
-      ])
-      setProjects(projectsData)
-      setNotifications(notificationsData)
+      const dashboard = await apiClient.getDashboard()
+      setProjects(dashboard.projects)
+      setNotifications(dashboard.notifications)
+      setUnreadCount(dashboard.unread_notifications)
     } catch (error) {
       toast({
         title: "Error loading dashboard",
@@ -44,7 +43,6 @@ export default function DashboardPage() {
 
   const activeProjects = projects.filter((p) => p.status === "active")
   const completedProjects = projects.filter((p) => p.status === "completed")
-  const unreadNotifications = notifications.filter((n) => !n.read)
 
   const getStatusColor = (status: string) => {
     switch (status) {
@@ -145,7 +143,7 @@ export default function DashboardPage() {
                 <AlertCircle className="h-4 w-4 text-muted-foreground" />
               </CardHeader>
               <CardContent>
-                <div className="text-2xl font-bold">{unreadNotifications.length}</div>
+                <div className="text-2xl font-bold">{unreadCount}</div>
                 <p className="text-xs text-muted-foreground">Unread messages</p>
               </CardContent>
             </Card>
@@ -70,6 +70,14 @@ export interface Notification {
   read_at?: string
 }
 
+export interface DashboardData {
+  projects: Project[]
+  task_counts: Record<string, number>
+  project_task_counts: Record<string, Record<string, number>>
+  unread_notifications: number
+  notifications: Notification[]
+}
+
 export interface Task {
   id: string
   title: string
@@ -119,6 +127,11 @@ class ApiClient {
     return response.json()
   }
 
+  // Dashboard: projects, task counts and notifications in one request
+  async getDashboard(): Promise<DashboardData> {
+    return this.request<DashboardData>("/api/v1/dashboard")
+  }
+
   // Auth endpoints
   async login(credentials: LoginCredentials): Promise<AuthResponse> {
     const formData = new FormData()